@@ -24,6 +24,7 @@ def unregister():
     prefs.unregister()
     ops.unregister()
     ui.unregister()
+    bu.unregister_handlers()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,67 @@
+"""
+Benchmark of the startup cost of the add-on `register()` and of `import bu`, each measured in a fresh `bpy` process.
+The time to `import bpy` itself is reported as a baseline and is not included in the other timings.
+
+Usage:
+    python benchmarks/bench_startup.py --repeat 5  # with the `bpy` module
+"""
+
+import argparse
+import compileall
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SNIPPETS = {
+    "import bpy": """
+start = time.perf_counter()
+import bpy
+elapsed = time.perf_counter() - start
+""",
+    "import bu": """
+import bpy
+sys.path.insert(0, {src!r})
+start = time.perf_counter()
+import bu
+elapsed = time.perf_counter() - start
+""",
+    "add-on register()": """
+import bpy
+import addon_utils
+sys.path.insert(0, {addons!r})
+start = time.perf_counter()
+addon_utils.enable("blender_utils", default_set=True, handle_error=None)
+elapsed = time.perf_counter() - start
+""",
+}
+
+
+def run(snippet: str) -> float:
+    code = f"import sys, time\n{snippet}\nprint('ELAPSED', elapsed)\n"
+    output = subprocess.run([sys.executable, "-c", code], check=True, capture_output=True, text=True).stdout
+    line = next(line for line in output.splitlines() if line.startswith("ELAPSED"))
+    return float(line.split()[1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5, help="fresh processes per measurement")
+    args = parser.parse_args()
+
+    # `bpy` disables writing bytecode, so compile once to keep the compilation out of the timings
+    compileall.compile_dir(ROOT, quiet=1)
+    with tempfile.TemporaryDirectory() as addons:
+        # the add-on is imported by its package name
+        os.symlink(ROOT, os.path.join(addons, "blender_utils"), target_is_directory=True)
+        for name, snippet in SNIPPETS.items():
+            snippet = snippet.format(src=os.path.join(ROOT, "src"), addons=addons)
+            times = [run(snippet) for _ in range(args.repeat)]
+            print(f"{name + ':':20} {statistics.median(times) * 1000:8.2f} ms (min {min(times) * 1000:.2f} ms)")
+
+
+if __name__ == "__main__":
+    main()
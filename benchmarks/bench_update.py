@@ -0,0 +1,74 @@
+"""
+Benchmark of `bu.update()` on large scenes, full sweep vs incremental.
+Timings include the evaluation of the tagged objects, as the next redraw would do.
+
+Usage:
+    blender -b --factory-startup --python benchmarks/bench_update.py -- --objects 10000 --dirty 10
+    python benchmarks/bench_update.py --objects 10000 --dirty 10  # with the `bpy` module
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import bpy
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+import bu  # noqa: E402
+
+
+def build_scene(num_objects: int):
+    bu.reset()
+    mesh = bpy.data.meshes.new("Mesh")
+    mesh.from_pydata([(0, 0, 0), (1, 0, 0), (0, 1, 0)], [], [(0, 1, 2)])
+    collection = bpy.context.scene.collection
+    for i in range(num_objects):
+        collection.objects.link(bpy.data.objects.new(f"Object{i}", mesh.copy()))
+    bpy.context.view_layer.update()
+
+
+def timeit(func, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    argv = sys.argv[sys.argv.index("--") + 1 :] if "--" in sys.argv else sys.argv[1:]
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--objects", type=int, default=10000)
+    parser.add_argument("--dirty", type=int, default=10, help="objects modified between two updates")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    build_scene(args.objects)
+    objects = list(bpy.context.scene.objects)[: args.dirty]
+
+    def modify():
+        for obj in objects:
+            obj.location.x += 1
+        bu.mark_dirty(objects)
+
+    def full():
+        modify()
+        bu.update(incremental=False)
+        bpy.context.view_layer.update()
+
+    def incremental():
+        modify()
+        bu.update(incremental=True)
+        bpy.context.view_layer.update()
+
+    full_time = timeit(full, args.repeat)
+    incremental_time = timeit(incremental, args.repeat)
+    print(f"objects: {args.objects}, dirty: {args.dirty}")
+    print(f"full:        {full_time * 1000:.2f} ms")
+    print(f"incremental: {incremental_time * 1000:.2f} ms ({full_time / incremental_time:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
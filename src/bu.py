@@ -1,6 +1,12 @@
 """https://docs.blender.org/api/current/info_advanced_blender_as_bpy.html"""
 
-import math
+import glob
+import json
+import os
+import re
+import time
+from collections import OrderedDict
+from itertools import chain
 
 import bpy
 import numpy as np
@@ -14,91 +20,325 @@ USE_WORLD_COORDINATES = False
 
 
 class Mode:
-    def __init__(self, mode_name="EDIT", active_obj: Object = None):
+    """
+    Switch an object, or a list of objects at once (multi-object edit/pose mode), to a mode and restore the
+    previous mode and active object on exit. Nothing is switched if the objects are already in the mode.
+    The class attributes count the switches performed and skipped, and the time spent in `mode_set`.
+    """
+
+    num_switches = 0
+    num_skipped = 0
+    switch_time = 0.0
+
+    def __init__(self, mode_name="EDIT", active_obj: "Object | list[Object]" = None):
         self.mode = mode_name
-        self.active = active_obj
+        self.objs: "list[Object]" = list(active_obj) if isinstance(active_obj, (list, tuple)) else [active_obj]
+        self.active = self.objs[0]
         self.pre_active = None
         self.pre_mode = "OBJECT"
+        self.selected: "list[Object]" = []
+        self.switched = False
+
+    @classmethod
+    def reset_counters(cls):
+        cls.num_switches = 0
+        cls.num_skipped = 0
+        cls.switch_time = 0.0
+
+    @classmethod
+    def _mode_set(cls, mode: str):
+        start = time.perf_counter()
+        bpy.ops.object.mode_set(mode=mode)
+        cls.switch_time += time.perf_counter() - start
+        cls.num_switches += 1
 
     def __enter__(self):
         self.pre_active = bpy.context.view_layer.objects.active
         if self.pre_active is not None:
-            self.pre_mode = bpy.context.object.mode
+            self.pre_mode = self.pre_active.mode
+        self.switched = self.pre_active != self.active or any(obj.mode != self.mode for obj in self.objs)
+        if not self.switched:
+            Mode.num_skipped += 1
+            return self.active if len(self.objs) == 1 else self.objs
+        if self.pre_mode != "OBJECT" and self.pre_active != self.active:
+            # leave the mode of the previous object first, not to drag it into the new one
+            self._mode_set("OBJECT")
+        if len(self.objs) > 1:
+            # all selected objects enter the mode with the active one
+            self.selected = [obj for obj in self.objs if not obj.select_get()]
+            for obj in self.selected:
+                obj.select_set(True)
         bpy.context.view_layer.objects.active = self.active
-        bpy.ops.object.mode_set(mode=self.mode)
-        return self.active
+        if any(obj.mode != self.mode for obj in self.objs):
+            self._mode_set(self.mode)
+        return self.active if len(self.objs) == 1 else self.objs
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        bpy.ops.object.mode_set(mode=self.pre_mode)
+        if not self.switched:
+            return
+        if self.pre_active != self.active and self.mode != "OBJECT":
+            self._mode_set("OBJECT")
+        for obj in self.selected:
+            obj.select_set(False)
         bpy.context.view_layer.objects.active = self.pre_active
+        if self.pre_active is not None and self.pre_active.mode != self.pre_mode:
+            self._mode_set(self.pre_mode)
+        if "EDIT" in (self.mode, self.pre_mode):
+            for obj in self.objs:
+                if obj is not None and obj.type == "ARMATURE":
+                    invalidate_armature_index(obj.data)
 
 
 def reset():
     bpy.ops.wm.read_factory_settings(use_empty=True)
 
 
-def update(context: Context = None):
+def run_job(job):
+    """
+    Run a job to completion and return its result. Jobs (the `iter_*` helpers) are generators yielding their
+    progress in [0, 1] between steps, so that the UI can also run them in time slices.
+    """
+    while True:
+        try:
+            next(job)
+        except StopIteration as stop:
+            return stop.value
+
+
+# objects modified since the last `update()`, by `bu` helpers or reported by the depsgraph
+_dirty_objects: "set[Object]" = set()
+_track_depsgraph = True
+
+
+def mark_dirty(obj_list: "Object | list[Object]"):
+    """Remember objects to be tagged by the next `update(incremental=True)`."""
+    _register_handlers()
+    if isinstance(obj_list, Object):
+        obj_list = [obj_list]
+    _dirty_objects.update(obj for obj in obj_list if obj is not None)
+
+
+def update(context: Context = None, incremental=False):
+    """
+    Update the view layer and tag objects for redraw. With `incremental`, only the objects marked by `mark_dirty()`
+    or updated in the depsgraph since the last call are tagged, instead of sweeping the whole scene.
+    """
+    global _track_depsgraph
     if context is None:
         context = bpy.context
-    context.view_layer.update()
-    context.scene.update_tag()
-    for obj in context.scene.objects:
-        # obj.hide_render = obj.hide_render
-        obj.update_tag()
+    _register_handlers()
+    if not incremental:
+        _dirty_objects.clear()
+        context.view_layer.update()
+        context.scene.update_tag()
+        for obj in context.scene.objects:
+            # obj.hide_render = obj.hide_render
+            obj.update_tag()
+        return
+    dirty = list(_dirty_objects)
+    _dirty_objects.clear()
+    for obj in dirty:
+        try:
+            obj.update_tag()
+        except ReferenceError:  # removed since marked
+            pass
+    # the updates caused by the tags themselves are not tracked
+    _track_depsgraph = False
+    try:
+        context.view_layer.update()
+    finally:
+        _track_depsgraph = True
+
+
+_GC_TYPES = ("objects", "collections", "actions", "meshes", "materials", "images")
+_GC_ALL_TYPES = _GC_TYPES + (
+    "armatures",
+    "cameras",
+    "lights",
+    "curves",
+    "lattices",
+    "metaballs",
+    "grease_pencils",
+    "shape_keys",
+    "node_groups",
+    "textures",
+    "particles",
+)
+# datablocks that are always alive
+_GC_ROOT_TYPES = ("scenes", "window_managers", "workspaces", "screens")
+
+
+def collect_garbage(
+    types: "tuple[str, ...]" = _GC_TYPES,
+    ignore_fake_user: "bool | tuple[str, ...]" = False,
+    empties=False,
+    empty_collections=False,
+    collections: "list[str]" = None,
+    remove: "list[bpy.types.ID]" = None,
+    dry_run=False,
+) -> "dict[str, list[str]]":
+    """
+    Remove datablocks with a single `bpy.data.batch_remove()`, after one pass over `bpy.data.user_map()`:
+    - datablocks of `types` (names of `bpy.data` collections) that cannot be reached from the scenes, the UI
+      or fake users. Fake users do not protect the `types` in `ignore_fake_user` (all of them if True);
+    - `empties`: childless empty objects;
+    - `empty_collections`: collections without any remaining object;
+    - `collections`: collections (by name) with all their child collections;
+    - `remove`: any other datablocks.
+    Returns the names of the removed datablocks (or the removable ones with `dry_run`) per `ID.id_type`.
+    """
+    user_map = bpy.data.user_map()
+    garbage = set(remove or [])
+    if empties:
+        garbage.update(obj for obj in bpy.data.objects if obj.type.startswith("EMPTY") and not obj.children)
+    for coll_name in collections or []:
+        coll = bpy.data.collections.get(coll_name)
+        if coll is not None:
+            garbage.add(coll)
+            garbage.update(coll.children_recursive)
+    if empty_collections:
+        garbage.update(coll for coll in bpy.data.collections if all(obj in garbage for obj in coll.all_objects))
+
+    if types:
+        if ignore_fake_user is True:
+            ignore_fake_user = types
+        unprotected = {id_data for attr in ignore_fake_user or () for id_data in getattr(bpy.data, attr)}
+        # invert the user map to walk from the roots to the datablocks they use
+        uses: "dict[bpy.types.ID, list[bpy.types.ID]]" = {}
+        for id_data, users in user_map.items():
+            for user in users:
+                uses.setdefault(user, []).append(id_data)
+        stack = [id_data for attr in _GC_ROOT_TYPES for id_data in getattr(bpy.data, attr)]
+        stack.extend(id_data for id_data in user_map if id_data.use_fake_user and id_data not in unprotected)
+        reached = set()
+        while stack:
+            id_data = stack.pop()
+            if id_data in reached or id_data in garbage:
+                continue
+            reached.add(id_data)
+            stack.extend(uses.get(id_data, ()))
+        garbage.update(
+            id_data
+            for attr in types
+            if hasattr(bpy.data, attr)
+            for id_data in getattr(bpy.data, attr)
+            if id_data not in reached
+        )
+
+    stats: "dict[str, list[str]]" = {}
+    for id_data in garbage:
+        stats.setdefault(id_data.id_type, []).append(id_data.name)
+    if not dry_run and garbage:
+        bpy.data.batch_remove(list(garbage))
+    return stats
 
 
 def remove_all(delete_actions=True):
-    for obj in bpy.data.objects.values():
-        bpy.data.objects.remove(obj, do_unlink=True)
-    for coll in bpy.data.collections:
-        bpy.data.collections.remove(coll)
+    remove = list(bpy.data.objects) + list(bpy.data.collections)
     if delete_actions:
-        for action in bpy.data.actions:
-            bpy.data.actions.remove(action, do_unlink=True)
-    bpy.ops.outliner.orphans_purge(do_recursive=True)
+        remove.extend(bpy.data.actions)
+    collect_garbage(_GC_ALL_TYPES, remove=remove)
 
 
 def remove_empty():
-    childless_empties = [e for e in bpy.data.objects if e.type.startswith("EMPTY") and not e.children]
-    bpy.data.batch_remove(childless_empties)
-    for coll in bpy.data.collections:
-        if len(coll.all_objects) == 0:
-            bpy.data.collections.remove(coll)
+    collect_garbage((), empties=True, empty_collections=True)
 
 
 def remove_collection(coll_name: str):
-    if coll_name not in bpy.data.collections:
-        return
-    coll = bpy.data.collections[coll_name]
-    for c in coll.children:
-        remove_collection(c)
-    bpy.data.collections.remove(coll, do_unlink=True)
+    collect_garbage((), collections=[coll_name])
 
 
 def remove_unused_actions(ignore_protection=True):
-    for action in bpy.data.actions:
-        if action.users == 0 or (ignore_protection and action.users == 1 and action.use_fake_user):
-            bpy.data.actions.remove(action)
+    collect_garbage(("actions",), ignore_fake_user=ignore_protection)
+
+
+_IMPORT_OPERATORS = {
+    ".glb": "import_scene.gltf",
+    ".gltf": "import_scene.gltf",
+    ".fbx": "import_scene.fbx",
+    ".obj": "wm.obj_import",
+    ".ply": "wm.ply_import",
+    ".usd": "wm.usd_import",
+    ".usda": "wm.usd_import",
+    ".usdc": "wm.usd_import",
+    ".usdz": "wm.usd_import",
+    ".abc": "wm.alembic_import",
+    ".bvh": "import_anim.bvh",
+}
+
+
+def _get_object_uids() -> np.ndarray:
+    uids = np.empty(len(bpy.data.objects), dtype=np.int64)
+    bpy.data.objects.foreach_get("session_uid", uids)
+    return uids
+
+
+def load_blend(
+    filepath: str, link=False, collections: "list[str]" = None, objects: "list[str]" = None
+) -> "list[Object]":
+    """
+    Append (or `link`) objects from a .blend file with `bpy.data.libraries.load()`, without operators.
+    `collections` are linked under the scene collection and `objects` to it directly; all objects by default.
+    """
+    scene_collection = bpy.context.scene.collection
+    with bpy.data.libraries.load(filepath, link=link) as (data_from, data_to):
+        if collections is None and objects is None:
+            objects = data_from.objects
+        data_to.collections = [name for name in collections or [] if name in data_from.collections]
+        data_to.objects = [name for name in objects or [] if name in data_from.objects]
+    new_objs = {}
+    for coll in data_to.collections:
+        if coll is not None:
+            if coll.name not in scene_collection.children:
+                scene_collection.children.link(coll)
+            new_objs.update(dict.fromkeys(coll.all_objects))
+    for obj in data_to.objects:
+        if obj is not None:
+            if obj.name not in scene_collection.objects and not obj.users_collection:
+                scene_collection.objects.link(obj)
+            new_objs[obj] = None
+    return list(new_objs)
 
 
 def load_file(filepath: str, *args, **kwargs) -> "list[Object]":
-    old_objs = set(bpy.context.scene.objects)
-    if filepath.endswith(".glb"):
-        bpy.ops.import_scene.gltf(filepath=filepath, *args, **kwargs)
-    elif filepath.endswith(".fbx"):
-        bpy.ops.import_scene.fbx(filepath=filepath, *args, **kwargs)
-    elif filepath.endswith(".obj"):
-        bpy.ops.wm.obj_import(filepath=filepath, *args, **kwargs)
-    elif filepath.endswith(".ply"):
-        bpy.ops.wm.ply_import(filepath=filepath, *args, **kwargs)
+    """
+    Import a file with the importer of its extension (see `_IMPORT_OPERATORS`), or `load_blend()` for .blend files,
+    and return the new objects sorted by name.
+    """
+    start = time.perf_counter()
+    ext = os.path.splitext(filepath)[1].lower()
+    if ext == ".blend":
+        imported_objs = load_blend(filepath, *args, **kwargs)
+    elif ext in _IMPORT_OPERATORS:
+        # new objects are found by their session UID instead of diffing the scene
+        max_uid = _get_object_uids().max(initial=0)
+        module, name = _IMPORT_OPERATORS[ext].split(".")
+        getattr(getattr(bpy.ops, module), name)(filepath=filepath, *args, **kwargs)
+        uids = _get_object_uids()
+        scene = bpy.context.scene
+        imported_objs = [bpy.data.objects[i] for i in np.flatnonzero(uids > max_uid).tolist()]
+        imported_objs = [obj for obj in imported_objs if scene in obj.users_scene]
     else:
         raise RuntimeError(f"Invalid input file: {filepath}")
-    imported_objs = set(bpy.context.scene.objects) - old_objs
     imported_objs = sorted(imported_objs, key=lambda x: x.name)
-    print("Imported:", imported_objs)
+    print(f"Imported in {time.perf_counter() - start:.3f}s:", imported_objs)
     return imported_objs
 
 
+def load_files(filepaths: "list[str]", *args, **kwargs) -> "dict[str, list[Object]]":
+    """Import several files with `load_file()`, returning the new objects of each file and reporting the timings."""
+    imported: "dict[str, list[Object]]" = {}
+    timings: "dict[str, float]" = {}
+    for filepath in filepaths:
+        start = time.perf_counter()
+        imported[filepath] = load_file(filepath, *args, **kwargs)
+        timings[filepath] = time.perf_counter() - start
+    print(f"Imported {len(filepaths)} files in {sum(timings.values()):.3f}s, slowest:")
+    for filepath, elapsed in sorted(timings.items(), key=lambda x: -x[1])[:5]:
+        print(f"  {elapsed:.3f}s {filepath}")
+    return imported
+
+
 def select_all():
     bpy.ops.object.select_all(action="SELECT")
 
@@ -118,7 +358,7 @@ def select_objs(obj_list: "list[Object]" = None, deselect_first=False):
 
 def select_mesh(obj_list: "list[Object]" = None, all=True, deselect_first=False):
     if not obj_list:
-        obj_list = bpy.context.scene.objects
+        obj_list = get_object_index().get("MESH", sort=False)
     if deselect_first:
         deselect()
     for obj in obj_list:
@@ -148,7 +388,7 @@ class Select:
 
 def get_type_objs(obj_list: "list[Object]" = None, type="MESH", sort=True) -> "list[Object]":
     if not obj_list:
-        obj_list = bpy.context.scene.objects
+        return get_object_index().get(type, sort=sort)
     type_obj_list = [obj for obj in obj_list if obj.type == type]
     if sort:
         type_obj_list = sorted(type_obj_list, key=lambda x: x.name)
@@ -165,12 +405,83 @@ def get_all_armature_obj(obj_list: "list[Object]" = None):
 
 def get_armature_obj(obj_list: "list[Object]" = None) -> Object:
     if not obj_list:
-        obj_list = bpy.context.scene.objects
+        obj_list = get_object_index().get("ARMATURE", sort=False)
     for obj in obj_list:
         if obj.type == "ARMATURE":
             return obj
 
 
+class ObjectIndex:
+    """
+    Objects of a scene partitioned by type in the order of `scene.objects`, with the selection state in a
+    view layer. Use `get_object_index()` to get a cached instance.
+    """
+
+    def __init__(self, scene: "bpy.types.Scene", view_layer: "bpy.types.ViewLayer"):
+        self.by_type: "dict[str, list[Object]]" = {}
+        self.selected_by_type: "dict[str, list[Object]]" = {}
+        for obj in scene.objects:
+            self.by_type.setdefault(obj.type, []).append(obj)
+            if obj.select_get(view_layer=view_layer):
+                self.selected_by_type.setdefault(obj.type, []).append(obj)
+        self.num_objects = sum(len(objs) for objs in self.by_type.values())
+        self.signature = _get_object_signature(scene, view_layer)
+
+    def __len__(self):
+        return self.num_objects
+
+    def get(self, type="MESH", sort=True, selected=False) -> "list[Object]":
+        objs = (self.selected_by_type if selected else self.by_type).get(type, [])
+        # sorted on demand, as renames do not invalidate the index
+        return sorted(objs, key=lambda x: x.name) if sort else list(objs)
+
+    def count(self, type="MESH", selected=False) -> int:
+        return len((self.selected_by_type if selected else self.by_type).get(type, []))
+
+
+_object_index_cache: "dict[tuple[int, str], ObjectIndex]" = {}
+
+
+def _get_object_signature(scene: "bpy.types.Scene", view_layer: "bpy.types.ViewLayer") -> "tuple | None":
+    """
+    `session_uid`s of the objects of the scene (read in bulk) and of the selected ones, or `None` if the view
+    layer is not synced yet with removed objects.
+    """
+    selected = view_layer.objects.selected[:]
+    if any(obj is None for obj in selected):
+        return None
+    uids = np.empty(len(scene.objects), dtype=np.int64)
+    scene.objects.foreach_get("session_uid", uids)
+    return uids.tobytes(), tuple(obj.session_uid for obj in selected)
+
+
+def get_object_index(context: Context = None, validate=True) -> ObjectIndex:
+    """
+    Cached `ObjectIndex` of the scene and view layer of `context`. The cache is invalidated when objects are
+    added, removed or (de)selected, as reported by the depsgraph.
+    `validate` also catches changes made by scripts since the last depsgraph update, by comparing the
+    `session_uid`s of the objects and of the selection (linear, but several times cheaper than a rebuild).
+    Polls skip it as the UI always updates the depsgraph before redrawing, so a script changing the selection
+    must call `view_layer.update()` before calling them.
+    """
+    if context is None:
+        context = bpy.context
+    _register_handlers()
+    scene, view_layer = context.scene, context.view_layer
+    key = (scene.session_uid, view_layer.name)
+    index = _object_index_cache.get(key)
+    if index is None or (
+        validate and (index.signature is None or index.signature != _get_object_signature(scene, view_layer))
+    ):
+        index = _object_index_cache[key] = ObjectIndex(scene, view_layer)
+    return index
+
+
+def invalidate_object_index():
+    """Drop all cached `ObjectIndex`es."""
+    _object_index_cache.clear()
+
+
 def set_armature_parent(mesh_obj_list: "list[Object]", armature_obj: Object, type="ARMATURE", no_inv=False):
     with Select(mesh_obj_list):
         # the active object will be the parent of all selected objects
@@ -178,63 +489,156 @@ def set_armature_parent(mesh_obj_list: "list[Object]", armature_obj: Object, typ
         bpy.ops.object.parent_set(type=type)
         if no_inv:
             bpy.ops.object.parent_no_inverse_set(keep_transform=False)
+    mark_dirty(list(mesh_obj_list) + [armature_obj])
     return armature_obj
 
 
 def get_keyframes(obj_list: "list[Object]" = None, mute_global_anim=False) -> "list[int]":
     if not obj_list:
         obj_list = bpy.context.scene.objects
-    keyframes = []
+    keyframes: "dict[int, None]" = {}
     for obj in obj_list:
         anim = obj.animation_data
         if anim is not None and anim.action is not None:
             if mute_global_anim and len(anim.action.groups) > 0:
                 anim.action.groups[0].mute = True
-            for fcu in anim.action.fcurves:
-                for keyframe in fcu.keyframe_points:
-                    x = keyframe.co.x
-                    x = math.ceil(x)
-                    if x not in keyframes:
-                        keyframes.append(x)
+            for fcu in _iter_action_fcurves(anim.action):
+                keyframes.update(dict.fromkeys(np.ceil(_get_fcurve_keys(fcu)[0]).astype(int).tolist()))
         shape_keys = obj.data.shape_keys if hasattr(obj.data, "shape_keys") else None
         if shape_keys:
             action = shape_keys.animation_data.action if shape_keys.animation_data else None
             if action:
-                for fcurve in action.fcurves:
+                for fcurve in _iter_action_fcurves(action):
                     if fcurve.data_path.startswith("key_blocks"):
-                        for keyframe in fcurve.keyframe_points:
-                            x = keyframe.co.x
-                            x = math.ceil(x)
-                            if x not in keyframes:
-                                keyframes.append(x)
-    return keyframes
+                        keyframes.update(dict.fromkeys(np.ceil(_get_fcurve_keys(fcurve)[0]).astype(int).tolist()))
+    return list(keyframes)
 
 
-def get_bones_idx_dict(armature_obj: Object):
+class ArmatureIndex:
+    """
+    Bone topology and rest data of an armature, in the order of `armature.bones` (same as `pose.bones`).
+    Use `get_armature_index()` to get a cached instance.
+    """
+
+    def __init__(self, armature_data: Armature):
+        bones = armature_data.bones
+        self.names: "list[str]" = [bone.name for bone in bones]
+        self.bones_idx_dict: "dict[str, int]" = {name: i for i, name in enumerate(self.names)}
+        self.parents = np.array(
+            [self.bones_idx_dict[bone.parent.name] if bone.parent else -1 for bone in bones], dtype=np.int64
+        )
+        self.connected = np.zeros(len(bones), dtype=bool)
+        bones.foreach_get("use_connect", self.connected)
+        self.depths = np.zeros(len(bones), dtype=np.int64)
+        for i in range(len(bones)):
+            parent = self.parents[i]
+            while parent >= 0:
+                self.depths[i] += 1
+                parent = self.parents[parent]
+        # parents always come before their children
+        self.order = np.argsort(self.depths, kind="stable")
+        self.levels = [np.flatnonzero(self.depths == d) for d in range(self.depths.max(initial=-1) + 1)]
+        self.rest_matrices = _foreach_get_matrix(bones, "matrix_local")
+        self.rest_matrices_inv = np.linalg.inv(self.rest_matrices)
+        self.rest_heads = _foreach_get_vector(bones, "head_local")
+        self.rest_tails = _foreach_get_vector(bones, "tail_local")
+
+    def __len__(self):
+        return len(self.names)
+
+
+_armature_index_cache: "dict[int, ArmatureIndex]" = {}
+
+
+def get_armature_index(armature_obj: "Object | Armature", validate=True) -> ArmatureIndex:
+    """
+    Cached `ArmatureIndex` of an armature datablock. The cache is invalidated when the armature is updated
+    in the depsgraph or leaves edit mode through `Mode`.
+    `validate` also catches bones added, removed or renamed by scripts since the last depsgraph update, by
+    comparing the bone names (linear, but much cheaper than a rebuild).
+    """
+    armature_data: Armature = armature_obj.data if isinstance(armature_obj, Object) else armature_obj
+    if armature_data.is_editmode:
+        # bones are not synced with edit bones until leaving edit mode
+        return ArmatureIndex(armature_data)
+    _register_handlers()
+    key = armature_data.session_uid
+    index = _armature_index_cache.get(key)
+    if (
+        index is None
+        or len(index) != len(armature_data.bones)
+        or (validate and index.names != [bone.name for bone in armature_data.bones])
+    ):
+        index = _armature_index_cache[key] = ArmatureIndex(armature_data)
+    return index
+
+
+def invalidate_armature_index(armature_obj: "Object | Armature" = None):
+    """Drop the cached `ArmatureIndex` of an armature, or all of them."""
+    if armature_obj is None:
+        _armature_index_cache.clear()
+        return
+    armature_data: Armature = armature_obj.data if isinstance(armature_obj, Object) else armature_obj
+    _armature_index_cache.pop(armature_data.session_uid, None)
+
+
+@bpy.app.handlers.persistent
+def _on_depsgraph_update(scene, depsgraph):
+    for update in depsgraph.updates:
+        if isinstance(update.id, Armature):
+            invalidate_armature_index(update.id.original)
+        elif isinstance(update.id, (bpy.types.Scene, bpy.types.Collection)):
+            # objects linked, unlinked or (de)selected
+            invalidate_object_index()
+        elif isinstance(update.id, Object):
+            if _track_depsgraph:
+                _dirty_objects.add(update.id.original)
+
+
+@bpy.app.handlers.persistent
+def _on_load(*args):
+    invalidate_armature_index()
+    invalidate_object_index()
+
+
+def _register_handlers():
+    if _on_depsgraph_update not in bpy.app.handlers.depsgraph_update_post:
+        bpy.app.handlers.depsgraph_update_post.append(_on_depsgraph_update)
+    if _on_load not in bpy.app.handlers.load_post:
+        bpy.app.handlers.load_post.append(_on_load)
+
+
+def unregister_handlers():
+    """Remove the handlers added on first use of the caches (when the add-on is disabled or reloaded)."""
+    if _on_depsgraph_update in bpy.app.handlers.depsgraph_update_post:
+        bpy.app.handlers.depsgraph_update_post.remove(_on_depsgraph_update)
+    if _on_load in bpy.app.handlers.load_post:
+        bpy.app.handlers.load_post.remove(_on_load)
+    _on_load()
+    _dirty_objects.clear()
+
+
+def get_bones_idx_dict(armature_obj: Object, armature_index: ArmatureIndex = None):
     if armature_obj is None:
         return None
-    bones_idx_dict: "dict[str, int]" = {bone.name: i for i, bone in enumerate(armature_obj.data.bones)}
+    if armature_index is None:
+        armature_index = get_armature_index(armature_obj)
+    bones_idx_dict: "dict[str, int]" = dict(armature_index.bones_idx_dict)
     return bones_idx_dict
 
 
-def get_rest_bones(armature_obj: Object):
+def get_rest_bones(armature_obj: Object, armature_index: ArmatureIndex = None):
     if armature_obj is None:
         return None, None, None
-    rest_bones = []
-    rest_bones_tail = []
-    bones_idx_dict: "dict[str, int]" = {}
-    armature_data: Armature = armature_obj.data
-    for i, bone in enumerate(armature_data.bones):
-        pos = bone.head_local
-        pos_tail = bone.tail_local
-        if USE_WORLD_COORDINATES:
-            pos = armature_obj.matrix_world @ pos
-            pos_tail = armature_obj.matrix_world @ pos_tail
-        rest_bones.append(pos)
-        rest_bones_tail.append(pos_tail)
-        bones_idx_dict[bone.name] = i
-    rest_bones = np.stack(rest_bones, axis=0)
-    rest_bones_tail = np.stack(rest_bones_tail, axis=0)
+    if armature_index is None:
+        armature_index = get_armature_index(armature_obj)
+    rest_bones = armature_index.rest_heads.copy()
+    rest_bones_tail = armature_index.rest_tails.copy()
+    if USE_WORLD_COORDINATES:
+        matrix_world = np.array(armature_obj.matrix_world)
+        rest_bones = rest_bones @ matrix_world[:3, :3].T + matrix_world[:3, 3]
+        rest_bones_tail = rest_bones_tail @ matrix_world[:3, :3].T + matrix_world[:3, 3]
+    bones_idx_dict: "dict[str, int]" = dict(armature_index.bones_idx_dict)
     return rest_bones, rest_bones_tail, bones_idx_dict
 
 
@@ -250,112 +654,337 @@ def set_rest_bones(
     armature_data: Armature = armature_obj.data
 
     if reset_as_rest:
-        # select_mesh(armature_obj.children, all=True, deselect_first=True)
-        mesh_list = []
-        for obj in armature_obj.children:
-            if obj.type != "MESH":
-                continue
-            mesh_list.append(obj)
-            bpy.context.view_layer.objects.active = obj
-            if obj.modifiers:
-                bpy.ops.object.modifier_apply(modifier=obj.modifiers[0].name)
-            with Select(obj):
-                bpy.ops.object.parent_clear(type="CLEAR_KEEP_TRANSFORM")
-        with Mode("POSE", armature_obj):
-            bpy.ops.pose.armature_apply(selected=False)
-        set_armature_parent(mesh_list, armature_obj)
+        apply_pose_as_rest(armature_obj)
 
     if head is not None:
         assert bones_idx_dict is not None
         with Mode("EDIT", armature_obj):
-            bones_absent = []
-            for bone in armature_data.edit_bones:
-                bone.use_connect = False
-                if bone.name not in bones_idx_dict:
-                    bones_absent.append(bone)
+            edit_bones = armature_data.edit_bones
+            edit_bones.foreach_set("use_connect", np.zeros(len(edit_bones), dtype=bool))
             if remove_absent_bones:
-                for bone in bones_absent:
-                    armature_data.edit_bones.remove(bone)
-            for bone in armature_data.edit_bones:
-                if bone.name in bones_idx_dict:
-                    bone_roll = bone.matrix.to_3x3().copy() @ mathutils.Vector((0.0, 0.0, 1.0))
-                    bone.head = head[bones_idx_dict[bone.name]]
-                    if tail is not None:
-                        bone.tail = tail[bones_idx_dict[bone.name]]
-                    bone.align_roll(bone_roll)
+                for bone in [bone for bone in edit_bones if bone.name not in bones_idx_dict]:
+                    edit_bones.remove(bone)
+            present = [i for i, bone in enumerate(edit_bones) if bone.name in bones_idx_dict]
+            names = [edit_bones[i].name for i in present]
+            idx = [bones_idx_dict[name] for name in names]
+            # keep the current Z axis of each bone
+            bone_roll = _foreach_get_matrix(edit_bones, "matrix")[present, :3, 2]
+            new_head = np.asarray(head, dtype=np.float64)[idx]
+            if tail is not None:
+                new_tail = np.asarray(tail, dtype=np.float64)[idx]
+            else:
+                new_tail = _foreach_get_vector(edit_bones, "tail")[present]
+            _set_edit_bones(
+                armature_obj, names, new_head, new_tail, _get_roll_from_axis(new_head, new_tail, bone_roll)
+            )
             # for bone in armature_data.edit_bones:
             #     if bone.parent is not None and len(bone.parent.children) == 1:
             #         bone.parent.tail = bone.head
 
-    if reset_as_rest:
-        with Mode("POSE", armature_obj):
-            bpy.ops.pose.select_all(action="SELECT")
-            bpy.ops.pose.transforms_clear()
+    mark_dirty(armature_obj)
+    return armature_obj
+
+
+def _foreach_get_matrix(collection, attr: str) -> np.ndarray:
+    matrices = np.empty(len(collection) * 16, dtype=np.float32)
+    collection.foreach_get(attr, matrices)
+    # matrices are stored column-major
+    return matrices.reshape(-1, 4, 4).transpose(0, 2, 1).astype(np.float64)
+
+
+def _foreach_get_vector(collection, attr: str, size=3) -> np.ndarray:
+    vectors = np.empty(len(collection) * size, dtype=np.float32)
+    collection.foreach_get(attr, vectors)
+    return vectors.reshape(-1, size).astype(np.float64)
 
+
+def clear_pose(armature_obj: Object):
+    """Same as `pose.transforms_clear` on all bones."""
+    pose_bones = armature_obj.pose.bones
+    num_bones = len(pose_bones)
+    pose_bones.foreach_set("location", np.zeros(num_bones * 3, dtype=np.float32))
+    pose_bones.foreach_set("rotation_quaternion", np.tile(np.float32([1, 0, 0, 0]), num_bones))
+    pose_bones.foreach_set("rotation_euler", np.zeros(num_bones * 3, dtype=np.float32))
+    pose_bones.foreach_set("rotation_axis_angle", np.tile(np.float32([0, 0, 1, 0]), num_bones))
+    pose_bones.foreach_set("scale", np.ones(num_bones * 3, dtype=np.float32))
+    armature_obj.update_tag()
+    mark_dirty(armature_obj)
     return armature_obj
 
 
-def get_pose_bones(armature_obj: Object):
+def _get_zero_roll_matrix(vec: np.ndarray) -> np.ndarray:
+    """Orientation of bones along `vec` with zero roll (same as `vec_roll_to_mat3_normalized()`)."""
+    nor = vec / np.maximum(np.linalg.norm(vec, axis=-1, keepdims=True), 1e-30)
+    x, y, z = nor.T
+    theta = 1 + y
+    theta_alt = x * x + z * z
+    regular = (theta > 6.1e-3) | (theta_alt > 2.5e-4**2)
+    # close to the negative Y axis, theta is recomputed from x and z for precision
+    theta = np.where(theta > 6.1e-3, theta, theta_alt * 0.5 + theta_alt * theta_alt * 0.125)
+    theta = np.where(regular, theta, 1.0)
+    mat = np.empty((len(nor), 3, 3))
+    mat[:, :, 0] = np.stack([1 - x * x / theta, -x, -x * z / theta], axis=-1)
+    mat[:, :, 1] = nor
+    mat[:, :, 2] = np.stack([-x * z / theta, -z, 1 - z * z / theta], axis=-1)
+    mat[~regular] = np.diag([-1.0, -1.0, 1.0])
+    return mat
+
+
+def _mat3_to_quat(mat: np.ndarray) -> np.ndarray:
+    """Batched `Matrix.to_quaternion()` for `(N, 3, 3)` matrices (canonical, with w >= 0)."""
+    # `m[:, i, j]` follows Blender's column-major `mat[i][j]`
+    m = mat.transpose(0, 2, 1) / np.maximum(np.linalg.norm(mat, axis=1), 1e-30)[:, :, None]
+    m = np.where(np.linalg.det(m)[:, None, None] < 0, -m, m)
+    q = np.empty((len(m), 4))
+    m00, m01, m02 = m[:, 0, 0], m[:, 0, 1], m[:, 0, 2]
+    m10, m11, m12 = m[:, 1, 0], m[:, 1, 1], m[:, 1, 2]
+    m20, m21, m22 = m[:, 2, 0], m[:, 2, 1], m[:, 2, 2]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cases = [
+            (
+                (m22 < 0) & (m00 > m11),
+                1 + m00 - m11 - m22,
+                m12 < m21,
+                lambda s: (m12 - m21, 0.25 * s * s, m01 + m10, m20 + m02),
+            ),
+            (
+                (m22 < 0) & (m00 <= m11),
+                1 - m00 + m11 - m22,
+                m20 < m02,
+                lambda s: (m20 - m02, m01 + m10, 0.25 * s * s, m12 + m21),
+            ),
+            (
+                (m22 >= 0) & (m00 < -m11),
+                1 - m00 - m11 + m22,
+                m01 < m10,
+                lambda s: (m01 - m10, m20 + m02, m12 + m21, 0.25 * s * s),
+            ),
+            (
+                (m22 >= 0) & (m00 >= -m11),
+                1 + m00 + m11 + m22,
+                np.zeros(len(m), dtype=bool),
+                lambda s: (0.25 * s * s, m12 - m21, m20 - m02, m01 - m10),
+            ),
+        ]
+        for case, trace, flip, components in cases:
+            s = 2 * np.sqrt(np.maximum(trace, 0.0))
+            s = np.where(flip, -s, s)
+            quat = np.stack(components(s), axis=-1) / s[:, None]
+            q[case] = quat[case]
+    q[~np.isfinite(q).all(axis=1)] = [1.0, 0.0, 0.0, 0.0]
+    return q / np.linalg.norm(q, axis=1, keepdims=True)
+
+
+def _get_roll_from_matrix(head: np.ndarray, tail: np.ndarray, matrix: np.ndarray) -> np.ndarray:
+    """Roll of bones along `tail - head` best matching the orientation `matrix` (same as `mat3_vec_to_roll()`)."""
+    zero_roll = _get_zero_roll_matrix(tail - head)
+    roll_mat = zero_roll.transpose(0, 2, 1) @ matrix[:, :3, :3]
+    q = _mat3_to_quat(roll_mat)
+    # twist around the bone Y axis
+    return 2 * np.arctan2(q[:, 2], q[:, 0])
+
+
+def _get_roll_from_axis(head: np.ndarray, tail: np.ndarray, axis: np.ndarray) -> np.ndarray:
+    """Roll of bones along `tail - head` pointing their Z axis to `axis` (same as `EditBone.align_roll()`)."""
+    nor = tail - head
+    length = np.linalg.norm(nor, axis=1)
+    nor = nor / np.maximum(length, 1e-30)[:, None]
+    axis = axis / np.maximum(np.linalg.norm(axis, axis=1, keepdims=True), 1e-30)
+    axis_dot = (axis * nor).sum(axis=1)
+    z_axis = _get_zero_roll_matrix(nor)[:, :, 2]
+    projected = axis - axis_dot[:, None] * nor
+    roll = np.arctan2(np.linalg.norm(np.cross(projected, z_axis), axis=1), (projected * z_axis).sum(axis=1))
+    roll = np.where((np.cross(z_axis, projected) * nor).sum(axis=1) < 0, -roll, roll)
+    eps = np.finfo(np.float32).eps
+    return np.where((length <= eps) | (np.abs(axis_dot) >= 1 - eps), 0.0, roll)
+
+
+def _set_edit_bones(armature_obj: Object, names: "list[str]", head: np.ndarray, tail: np.ndarray, roll: np.ndarray):
+    """Set head, tail and roll of the given edit bones at once (in edit mode)."""
+    edit_bones = armature_obj.data.edit_bones
+    edit_idx_dict = {bone.name: i for i, bone in enumerate(edit_bones)}
+    idx = np.array([edit_idx_dict[name] for name in names], dtype=np.int64)
+    for attr, values, size in (("head", head, 3), ("tail", tail, 3), ("roll", roll, 1)):
+        data = np.empty(len(edit_bones) * size, dtype=np.float32)
+        edit_bones.foreach_get(attr, data)
+        data = data.reshape(-1, size)
+        data[idx] = np.reshape(values, (-1, size))
+        edit_bones.foreach_set(attr, data.ravel())
+
+
+def _deform_mesh_by_armature(mesh_obj: Object, armature_obj: Object, modifier, skinning: np.ndarray):
+    """
+    Bake the deformation of an Armature modifier into the mesh (and all its shape keys), given the
+    rest-to-pose matrices `skinning` of `armature_obj.pose.bones` in armature space.
+    Linear blend skinning from vertex groups, as the modifier does without "Preserve Volume" and envelopes.
+    """
+    mesh_data: Mesh = mesh_obj.data
+    num_vertices = len(mesh_data.vertices)
+    pose_bones = armature_obj.pose.bones
+    deform_bones = {pb.name: i for i, pb in enumerate(pose_bones) if pb.bone.use_deform}
+
+    vertex_weights = VertexWeights.from_mesh(mesh_obj)
+    group_map = np.array([deform_bones.get(name, -1) for name in vertex_weights.names], dtype=np.int64)
+    bone_cols = group_map[vertex_weights.cols]
+    keep = bone_cols >= 0
+    rows, bones, weights = vertex_weights.rows[keep], bone_cols[keep], vertex_weights.weights[keep].astype(np.float64)
+
+    flat = skinning[:, :3, :].reshape(-1, 12)
+    blend = np.stack([np.bincount(rows, weights=weights * flat[bones, i], minlength=num_vertices) for i in range(12)])
+    blend = blend.T.reshape(num_vertices, 3, 4)
+    contrib = np.bincount(rows, weights=weights, minlength=num_vertices)
+    deformed = contrib > 1e-4
+    blend[deformed] /= contrib[deformed, None, None]
+    blend[~deformed] = np.eye(4)[:3]
+
+    if modifier.vertex_group:
+        # the modifier only applies the given fraction of the deformation
+        group = mesh_obj.vertex_groups.get(modifier.vertex_group)
+        factor = np.zeros(num_vertices)
+        if group is not None:
+            in_group = vertex_weights.cols == group.index
+            factor[vertex_weights.rows[in_group]] = vertex_weights.weights[in_group]
+        if modifier.invert_vertex_group:
+            factor = 1 - factor
+        blend = factor[:, None, None] * blend + (1 - factor[:, None, None]) * np.eye(4)[:3]
+
+    # mesh -> armature space and back
+    premat = np.linalg.inv(np.array(armature_obj.matrix_world)) @ np.array(mesh_obj.matrix_world)
+    blend = np.linalg.inv(premat)[:3] @ np.concatenate([blend, np.tile([[0, 0, 0, 1.0]], (num_vertices, 1, 1))], 1)
+    blend = blend @ premat
+
+    def deform(co: np.ndarray):
+        co = co.reshape(-1, 3).astype(np.float64)
+        co = np.einsum("vij,vj->vi", blend[:, :, :3], co) + blend[:, :, 3]
+        return co.astype(np.float32).ravel()
+
+    co = np.empty(num_vertices * 3, dtype=np.float32)
+    if mesh_data.shape_keys:
+        for kb in mesh_data.shape_keys.key_blocks:
+            kb.points.foreach_get("co", co)
+            kb.points.foreach_set("co", deform(co))
+    mesh_data.vertices.foreach_get("co", co)
+    mesh_data.vertices.foreach_set("co", deform(co))
+    mesh_data.update()
+    mark_dirty(mesh_obj)
+
+
+def apply_pose_as_rest(armature_obj: Object):
+    """
+    Apply the current pose as the rest pose, keeping the shape of the meshes deformed by the armature.
+    Works on data level instead of `modifier_apply`/`parent_set`/`pose.armature_apply`,
+    so the only context-dependent step left is a single edit-mode session of the armature.
+    """
+    return run_job(iter_apply_pose_as_rest(armature_obj))
+
+
+def iter_apply_pose_as_rest(armature_obj: Object):
+    """Steps of `apply_pose_as_rest()`, yielding the progress after each deformed mesh."""
+    assert armature_obj is not None, "Armature object is None"
+    pose_bones = armature_obj.pose.bones
+    names = [pb.name for pb in pose_bones]
+    pose_matrix = _foreach_get_matrix(pose_bones, "matrix")
+    armature_index = get_armature_index(armature_obj)
+    rest_matrix = armature_index.rest_matrices[[armature_index.bones_idx_dict[n] for n in names]]
+    skinning = pose_matrix @ np.linalg.inv(rest_matrix)
+    head = _foreach_get_vector(pose_bones, "head")
+    tail = _foreach_get_vector(pose_bones, "tail")
+
+    deformed: "dict[Mesh, tuple[Object, bpy.types.ArmatureModifier]]" = {}
+    for obj in bpy.data.objects:
+        if obj.type != "MESH" or obj.data in deformed:
+            continue
+        modifier = next((m for m in obj.modifiers if m.type == "ARMATURE" and m.object == armature_obj), None)
+        if modifier is None:
+            continue
+        assert (
+            modifier.use_vertex_groups and not modifier.use_bone_envelopes and not modifier.use_deform_preserve_volume
+        ), f"Unsupported Armature modifier settings on `{obj.name}`"
+        deformed[obj.data] = (obj, modifier)
+
+    for i, (obj, modifier) in enumerate(deformed.values()):
+        _deform_mesh_by_armature(obj, armature_obj, modifier, skinning)
+        yield (i + 1) / (len(deformed) + 1)
+
+    roll = _get_roll_from_matrix(head, tail, pose_matrix)
+    with Mode("EDIT", armature_obj):
+        _set_edit_bones(armature_obj, names, head, tail, roll)
+    clear_pose(armature_obj)
+    yield 1.0
+    return armature_obj
+
+
+def get_pose_bones(armature_obj: Object, armature_index: ArmatureIndex = None):
     if armature_obj is None:
         return None, None, None
-    bones = []
-    bones_tail = []
-    bones_rotation_relative_to_posed = []
-    bones_rotation_relative_to_rest = []
-    bones_transform_global = []
-    for bone in armature_obj.pose.bones:
-        # pos = bone.matrix @ bone.location
-        pos = bone.head
-        pos_tail = bone.tail
-        if USE_WORLD_COORDINATES:
-            pos = armature_obj.matrix_world @ pos
-            pos_tail = armature_obj.matrix_world @ pos_tail
-        bones.append(np.array(pos))
-        bones_tail.append(np.array(pos_tail))
-
-        # rot_rel = bone.rotation_quaternion  # same as bone.matrix_basis.to_quaternion(), relative to posed parent in rest local coordinates
-        # To armature coordinates:
-        rot_rel = bone.bone.matrix_local @ bone.matrix_basis @ bone.bone.matrix_local.inverted()
-        rot_rel_rest = rot_rel.copy()  # relative to rest parent
-        if bone.parent is not None:
-            parent_r2p = bone.parent.matrix @ bone.parent.bone.matrix_local.inverted()
-            rot_rel = parent_r2p @ rot_rel @ parent_r2p.inverted()
-        if USE_WORLD_COORDINATES:
-            rot_rel = armature_obj.matrix_world @ rot_rel @ armature_obj.matrix_world.inverted()
-            rot_rel_rest = armature_obj.matrix_world @ rot_rel_rest @ armature_obj.matrix_world.inverted()
-        bones_rotation_relative_to_posed.append(np.array(rot_rel.to_quaternion()))
-        bones_rotation_relative_to_rest.append(np.array(rot_rel_rest.to_quaternion()))
-
-        # https://blender.stackexchange.com/questions/44637/how-can-i-manually-calculate-bpy-types-posebone-matrix-using-blenders-python-ap
-        # PoseBone.head == PoseBone.matrix @ PoseBone.bone.matrix_local.inverted() @ PoseBone.bone.head_local
-        # PoseBone.bone.matrix_local: initial (zero) pose to rest pose (in armature coordinates)
-        # PoseBone.matrix: initial (zero) pose to current pose (in armature coordinates)
-        matrix = bone.matrix @ bone.bone.matrix_local.inverted()
-        # matrix: rest pose to current pose (in armature coordinates)
-        if USE_WORLD_COORDINATES:
-            # posed = matrix @ rest --> world @ posed = (world @ matrix @ world^(-1)) @ (world @ rest)
-            matrix = armature_obj.matrix_world @ matrix @ armature_obj.matrix_world.inverted()
-        bones_transform_global.append(matrix)
-
-    bones = np.stack(bones, axis=0)
-    bones_tail = np.stack(bones_tail, axis=0)
-    bones_rotation_relative_to_posed = np.stack(bones_rotation_relative_to_posed, axis=0)
-    bones_rotation_relative_to_rest = np.stack(bones_rotation_relative_to_rest, axis=0)
-    bones_transform_global = np.stack(bones_transform_global, axis=0)
+    if armature_index is None:
+        armature_index = get_armature_index(armature_obj)
+    pose_bones = armature_obj.pose.bones
+    parents = armature_index.parents
+    has_parent = parents >= 0
+    rest = armature_index.rest_matrices
+    rest_inv = armature_index.rest_matrices_inv
+
+    # pos = bone.matrix @ bone.location
+    bones = _foreach_get_vector(pose_bones, "head")
+    bones_tail = _foreach_get_vector(pose_bones, "tail")
+    pose_matrix = _foreach_get_matrix(pose_bones, "matrix")
+
+    # rot_rel = bone.rotation_quaternion  # same as bone.matrix_basis.to_quaternion(), relative to posed parent in rest local coordinates
+    # To armature coordinates:
+    rot_rel = rest @ _foreach_get_matrix(pose_bones, "matrix_basis") @ rest_inv
+    rot_rel_rest = rot_rel.copy()  # relative to rest parent
+    parent_r2p = pose_matrix[parents[has_parent]] @ rest_inv[parents[has_parent]]
+    rot_rel[has_parent] = parent_r2p @ rot_rel[has_parent] @ np.linalg.inv(parent_r2p)
+
+    # https://blender.stackexchange.com/questions/44637/how-can-i-manually-calculate-bpy-types-posebone-matrix-using-blenders-python-ap
+    # PoseBone.head == PoseBone.matrix @ PoseBone.bone.matrix_local.inverted() @ PoseBone.bone.head_local
+    # PoseBone.bone.matrix_local: initial (zero) pose to rest pose (in armature coordinates)
+    # PoseBone.matrix: initial (zero) pose to current pose (in armature coordinates)
+    bones_transform_global = pose_matrix @ rest_inv
+    # matrix: rest pose to current pose (in armature coordinates)
+
+    if USE_WORLD_COORDINATES:
+        matrix_world = np.array(armature_obj.matrix_world)
+        matrix_world_inv = np.linalg.inv(matrix_world)
+        bones = bones @ matrix_world[:3, :3].T + matrix_world[:3, 3]
+        bones_tail = bones_tail @ matrix_world[:3, :3].T + matrix_world[:3, 3]
+        rot_rel = matrix_world @ rot_rel @ matrix_world_inv
+        rot_rel_rest = matrix_world @ rot_rel_rest @ matrix_world_inv
+        # posed = matrix @ rest --> world @ posed = (world @ matrix @ world^(-1)) @ (world @ rest)
+        bones_transform_global = matrix_world @ bones_transform_global @ matrix_world_inv
+
+    bones_rotation_relative_to_posed = _mat3_to_quat(rot_rel[:, :3, :3])
+    bones_rotation_relative_to_rest = _mat3_to_quat(rot_rel_rest[:, :3, :3])
     return bones, bones_tail, bones_rotation_relative_to_posed, bones_rotation_relative_to_rest, bones_transform_global
 
 
-def set_bone_pose(armature_obj: Object, pose: np.ndarray, bones_idx_dict: "dict[str, int]", local=False):
+def set_bone_pose(
+    armature_obj: Object,
+    pose: np.ndarray,
+    bones_idx_dict: "dict[str, int]",
+    local=False,
+    armature_index: ArmatureIndex = None,
+):
     assert armature_obj is not None, "Armature object is None"
-    for bone in armature_obj.pose.bones:
-        if bone.name in bones_idx_dict:
+    if armature_index is None:
+        armature_index = get_armature_index(armature_obj)
+    pose_bones = armature_obj.pose.bones
+    # global poses depend on the evaluated parent poses, so the view layer is updated once per hierarchy level
+    levels = [armature_index.order] if local else armature_index.levels
+    for level in levels:
+        for i in level:
+            bone = pose_bones[armature_index.names[i]]
+            if bone.name not in bones_idx_dict:
+                continue
             bone_pose = pose[bones_idx_dict[bone.name]]
             print(f"{bone.name}: {bone_pose}")
             if local:
                 bone.matrix_basis = mathutils.Quaternion(bone_pose).normalized().to_matrix().to_4x4()
             else:
-                bone.matrix = mathutils.Matrix(bone_pose) @ bone.bone.matrix_local
-            bpy.context.view_layer.update()
+                bone.matrix = mathutils.Matrix(bone_pose) @ mathutils.Matrix(armature_index.rest_matrices[i])
+        bpy.context.view_layer.update()
+    mark_dirty(armature_obj)
     return armature_obj
 
 
@@ -390,14 +1019,71 @@ def get_evaluated_vertices(mesh_obj: Object):
     return verts
 
 
-def get_faces(mesh_obj: Object):
-    bm = bmesh.new()
-    bm.from_mesh(mesh_obj.data)
-    bm.faces.ensure_lookup_table()
-    vert_idx = [[v.index for v in f.verts] for f in bm.faces]
-    bm.free()
-    assert len(set(map(len, vert_idx))) == 1, "All faces should be triangles"
-    return np.array(vert_idx)
+_POLY_MAP_ATTR = "_bu_poly_map"
+
+
+def triangulate_meshes(
+    mesh_obj_list: "list[Object | Mesh]", quad_method="BEAUTY", ngon_method="BEAUTY"
+) -> "dict[Mesh, np.ndarray]":
+    """
+    Triangulate mesh datablocks in place with `bmesh.ops.triangulate()`, without edit mode nor operators.
+    Meshes shared by several objects are processed once, and meshes of triangles are left untouched.
+    Returns the index of the original polygon of each triangle (in `get_faces()` order) per mesh.
+    """
+    poly_maps: "dict[Mesh, np.ndarray]" = {}
+    for mesh_obj in mesh_obj_list:
+        mesh: Mesh = mesh_obj.data if isinstance(mesh_obj, Object) else mesh_obj
+        if not isinstance(mesh, Mesh) or mesh in poly_maps:
+            continue
+        assert not mesh.is_editmode, f"Mesh `{mesh.name}` is in edit mode"
+        num_polygons = len(mesh.polygons)
+        loop_totals = np.empty(num_polygons, dtype=np.int32)
+        mesh.polygons.foreach_get("loop_total", loop_totals)
+        if (loop_totals == 3).all():
+            poly_maps[mesh] = np.arange(num_polygons)
+            continue
+        # triangles inherit the attributes of their polygon
+        mesh.attributes.new(_POLY_MAP_ATTR, "INT", "FACE").data.foreach_set(
+            "value", np.arange(num_polygons, dtype=np.int32)
+        )
+        bm = bmesh.new()
+        try:
+            bm.from_mesh(mesh)
+            bmesh.ops.triangulate(bm, faces=bm.faces[:], quad_method=quad_method, ngon_method=ngon_method)
+            bm.to_mesh(mesh)
+        finally:
+            bm.free()
+        poly_map = np.empty(len(mesh.polygons), dtype=np.int32)
+        attribute = mesh.attributes[_POLY_MAP_ATTR]
+        attribute.data.foreach_get("value", poly_map)
+        mesh.attributes.remove(attribute)
+        mesh.update()
+        poly_maps[mesh] = poly_map.astype(np.int64)
+    return poly_maps
+
+
+def get_faces(mesh_obj: Object, triangulate=False):
+    """Vertex indices of the triangles of a mesh. With `triangulate`, other polygons are triangulated in place."""
+    mesh_data: Mesh = mesh_obj.data
+    if triangulate:
+        triangulate_meshes([mesh_data])
+    loop_totals = np.empty(len(mesh_data.polygons), dtype=np.int32)
+    mesh_data.polygons.foreach_get("loop_total", loop_totals)
+    assert (loop_totals == 3).all(), "All faces should be triangles, use `triangulate=True`"
+    vert_idx = np.empty(loop_totals.sum(), dtype=np.int32)
+    mesh_data.polygons.foreach_get("vertices", vert_idx)
+    return vert_idx.astype(np.int64).reshape(len(loop_totals), -1)
+
+
+def get_vertices(mesh_obj: Object):
+    mesh_data: Mesh = mesh_obj.data
+    verts = np.empty(len(mesh_data.vertices) * 3, dtype=np.float64)
+    mesh_data.vertices.foreach_get("co", verts)
+    verts = verts.reshape(-1, 3)
+    if USE_WORLD_COORDINATES:
+        matrix_world = np.array(mesh_obj.matrix_world)
+        verts = verts @ matrix_world[:3, :3].T + matrix_world[:3, 3]
+    return verts
 
 
 def get_rest_vertices(mesh_obj_list: "list[Object]", bones_idx_dict: "dict[str, int]" = None):
@@ -405,24 +1091,10 @@ def get_rest_vertices(mesh_obj_list: "list[Object]", bones_idx_dict: "dict[str,
     bw_all = []
     faces_all = []
     for mesh_obj in mesh_obj_list:
-        mesh_data: Mesh = mesh_obj.data
-        verts = mesh_data.vertices
         if bones_idx_dict is not None:
-            weights = {}
-            for v in verts:
-                for group in v.groups:
-                    weights.setdefault(group.group, {})[v.index] = group.weight
-            bw = np.zeros((len(verts), len(bones_idx_dict)))
-            for bone_index, vertex_weights in weights.items():
-                # print(f"Bone {bone_index} ({mesh_obj.vertex_groups[bone_index].name})")
-                for vert_index, vert_weight in sorted(vertex_weights.items(), key=lambda x: x[1], reverse=True):
-                    # print(f"Vertex {vert_index} = {vert_weight}")
-                    bw[vert_index, bones_idx_dict[mesh_obj.vertex_groups[bone_index].name]] = vert_weight
+            bw = VertexWeights.from_mesh(mesh_obj).to_dense(bones_idx_dict)
             bw_all.append(bw)
-        if USE_WORLD_COORDINATES:
-            verts_pos = np.array([mesh_obj.matrix_world @ v.co for v in mesh_data.vertices])
-        else:
-            verts_pos = np.array([v.co for v in mesh_data.vertices])
+        verts_pos = get_vertices(mesh_obj)
         verts_all.append(verts_pos)
         faces = get_faces(mesh_obj)
         faces_all.append(faces)
@@ -443,23 +1115,340 @@ def get_rest_vertices(mesh_obj_list: "list[Object]", bones_idx_dict: "dict[str,
     return verts_all, faces_all, bw_all
 
 
+class VertexWeights:
+    """
+    Sparse (COO) vertex-group weights of a mesh, read once and written back in one bulk pass.
+    Editing methods work in place and return `self`, so a whole cleanup can be chained, e.g.:
+    `VertexWeights.from_mesh(obj).merge({"a": "b"}).normalize().prune(1e-3).limit(4).remove_empty().to_mesh(obj)`
+    """
+
+    def __init__(self, rows: np.ndarray, cols: np.ndarray, weights: np.ndarray, names: "list[str]", num_vertices: int):
+        self.rows = np.asarray(rows, dtype=np.int64)
+        self.cols = np.asarray(cols, dtype=np.int64)
+        self.weights = np.asarray(weights, dtype=np.float32)
+        self.names = list(names)
+        self.num_vertices = num_vertices
+
+    def __len__(self):
+        return len(self.weights)
+
+    def __repr__(self):
+        return f"VertexWeights({self.num_vertices} vertices, {len(self.names)} groups, {len(self)} weights)"
+
+    @classmethod
+    def from_mesh(cls, mesh_obj: Object):
+        mesh_data: Mesh = mesh_obj.data
+        rows, cols, weights = _get_mesh_weights(mesh_data)
+        names = [vg.name for vg in mesh_obj.vertex_groups]
+        # vertices may still reference groups that have been removed
+        valid = cols < len(names)
+        return cls(rows[valid], cols[valid], weights[valid], names, len(mesh_data.vertices))
+
+    @classmethod
+    def from_dense(cls, weights: np.ndarray, bones_idx_dict: "dict[str, int]", threshold=0.0):
+        names = list(bones_idx_dict)
+        weights = weights[:, list(bones_idx_dict.values())]
+        rows, cols = np.nonzero(weights > threshold)
+        return cls(rows, cols, weights[rows, cols], names, weights.shape[0])
+
+    @classmethod
+    def from_compact(cls, indices: np.ndarray, weights: np.ndarray, bones_idx_dict: "dict[str, int]", threshold=0.0):
+        weights = _dequantize_weights(weights)
+        rows, slots = np.nonzero(weights > threshold)
+        names = list(bones_idx_dict)
+        names_order = np.argsort(np.array(list(bones_idx_dict.values()), dtype=np.int64))
+        cols = names_order[indices[rows, slots].astype(np.int64)]
+        return cls(rows, cols, weights[rows, slots], names, weights.shape[0])
+
+    def to_compact(self, bones_idx_dict: "dict[str, int]" = None, k=4, quantize="float16"):
+        """See `compress_weights()`."""
+        if bones_idx_dict is None:
+            bones_idx_dict = {name: i for i, name in enumerate(self.names)}
+        used = np.unique(self.cols)
+        col_map = np.zeros(len(self.names), dtype=np.int64)
+        col_map[used] = [bones_idx_dict[self.names[i]] for i in used]
+        return _compress_sparse_weights(
+            self.rows, col_map[self.cols], self.weights, self.num_vertices, len(bones_idx_dict), k, quantize
+        )
+
+    def to_dense(self, bones_idx_dict: "dict[str, int]" = None) -> np.ndarray:
+        if bones_idx_dict is None:
+            bones_idx_dict = {name: i for i, name in enumerate(self.names)}
+        used = np.unique(self.cols)
+        col_map = np.zeros(len(self.names), dtype=np.int64)
+        col_map[used] = [bones_idx_dict[self.names[i]] for i in used]
+        bw = np.zeros((self.num_vertices, len(bones_idx_dict)))
+        bw[self.rows, col_map[self.cols]] = self.weights
+        return bw
+
+    def to_mesh(self, mesh_obj: Object):
+        """
+        Replace all vertex groups of `mesh_obj` with these weights. Groups that already exist keep their order,
+        lock state and active status, and new groups are added after them.
+        """
+        assert len(mesh_obj.data.vertices) == self.num_vertices, "Vertex number mismatch"
+        vertex_groups = mesh_obj.vertex_groups
+        previous_names = [vg.name for vg in vertex_groups]
+        locked = {vg.name for vg in vertex_groups if vg.lock_weight}
+        active = vertex_groups.active.name if vertex_groups.active is not None else None
+        # dropping all weights at once is much faster than removing the weights of each existing group
+        vertex_groups.clear()
+
+        names_idx_dict = {name: i for i, name in enumerate(self.names)}
+        names = [name for name in previous_names if name in names_idx_dict]
+        kept = set(names)
+        names += [name for name in self.names if name not in kept]
+        for name in names:
+            vertex_groups.new(name=name).lock_weight = name in locked
+        col_map = np.array([vertex_groups[name].index for name in self.names], dtype=np.int64)
+        _set_mesh_weights(mesh_obj.data, self.rows, col_map[self.cols], self.weights)
+        if active in names_idx_dict:
+            vertex_groups.active_index = vertex_groups[active].index
+        mesh_obj.data.update()
+        mark_dirty(mesh_obj)
+        return mesh_obj
+
+    def _sum_duplicates(self):
+        if not self.names:
+            return
+        key = self.rows * len(self.names) + self.cols
+        key, inverse = np.unique(key, return_inverse=True)
+        weights = np.bincount(inverse, weights=self.weights)
+        self.rows, self.cols = np.divmod(key, len(self.names))
+        # same as `VertexGroup.add(..., "ADD")`
+        self.weights = np.minimum(weights, 1.0).astype(np.float32)
+
+    def _filter(self, mask: np.ndarray):
+        self.rows = self.rows[mask]
+        self.cols = self.cols[mask]
+        self.weights = self.weights[mask]
+
+    def merge(self, name_map: "dict[str, str]"):
+        """Add the weights of each source group to its target group (created if needed) and drop the source."""
+
+        def resolve(name: str):
+            seen = set()
+            while name in name_map and name not in seen:
+                seen.add(name)
+                name = name_map[name]
+            return name
+
+        targets = [resolve(name) for name in self.names]
+        names = [name for name, target in zip(self.names, targets) if name == target]
+        for target in targets:
+            if target not in names:
+                names.append(target)
+        names_idx_dict = {name: i for i, name in enumerate(names)}
+        col_map = np.array([names_idx_dict[target] for target in targets], dtype=np.int64)
+        self.cols = col_map[self.cols]
+        self.names = names
+        self._sum_duplicates()
+        return self
+
+    def _is_locked(self, locked: "list[str]") -> np.ndarray:
+        locked = set(locked)
+        return np.array([name in locked for name in self.names], dtype=bool)[self.cols]
+
+    def normalize(self, locked: "list[str]" = ()):
+        """Make each vertex's weights sum to 1. Groups in `locked` keep their weights and the others share the rest."""
+        is_locked = self._is_locked(locked)
+        locked_totals = np.bincount(self.rows[is_locked], weights=self.weights[is_locked], minlength=self.num_vertices)
+        totals = np.bincount(self.rows[~is_locked], weights=self.weights[~is_locked], minlength=self.num_vertices)
+        scale = np.maximum(1 - locked_totals, 0) / np.maximum(totals, 1e-12)
+        self.weights = np.where(is_locked, self.weights, self.weights * scale[self.rows]).astype(np.float32)
+        return self
+
+    def prune(self, threshold=0.0, locked: "list[str]" = ()):
+        """Remove weights not greater than `threshold`, except in the groups in `locked`."""
+        self._filter((self.weights > threshold) | self._is_locked(locked))
+        return self
+
+    def limit(self, k=4):
+        """Keep only the `k` largest weights of each vertex."""
+        order = np.lexsort((-self.weights, self.rows))
+        rows = self.rows[order]
+        rank = np.arange(len(rows)) - np.searchsorted(rows, rows)
+        self._filter(order[rank < k])
+        return self
+
+    def remove_empty(self):
+        used, self.cols = np.unique(self.cols, return_inverse=True)
+        self.cols = self.cols.reshape(-1)
+        self.names = [self.names[i] for i in used]
+        return self
+
+    def smooth(
+        self,
+        laplacian,
+        iterations=10,
+        factor=0.5,
+        diffusion_time: float = None,
+        mask=None,
+        cutoff=1e-4,
+        locked: "list[str]" = (),
+    ):
+        """
+        Smooth the weights on the mesh graph of `get_laplacian()`, like `smooth_vertex_data()` (or
+        `diffuse_vertex_data()` if `diffusion_time` is given), but only over the support of each group dilated
+        by as many edges as the weights can spread, so the cost follows the weights and not vertices x groups.
+        Diffusion spreads everywhere: the support grows until the weights on its border are below `cutoff`.
+        The groups in `locked` are left unchanged.
+        """
+        is_locked = self._is_locked(locked)
+        fixed = (self.rows[is_locked], self.cols[is_locked], self.weights[is_locked])
+        self._filter(~is_locked)
+        operator = _SupportOperator(laplacian, self, iterations if diffusion_time is None else 16, mask)
+        if diffusion_time is None:
+            x = _smooth_support(operator, iterations, factor)
+        else:
+            while True:
+                x = _diffuse_support(operator, diffusion_time)
+                border = operator.distances == operator.rings
+                peak = np.zeros(len(self.names))
+                np.maximum.at(peak, operator.groups[border], np.abs(x[border]))
+                if not np.any((peak > cutoff) & operator.truncated):
+                    break
+                operator = _SupportOperator(laplacian, self, operator.rings * 2, mask)
+
+        nonzero = x > 0
+        self.rows = np.concatenate([operator.vertices[nonzero], fixed[0]])
+        self.cols = np.concatenate([operator.groups[nonzero], fixed[1]])
+        self.weights = np.concatenate([x[nonzero], fixed[2]]).astype(np.float32)
+        return self
+
+
+def _get_mesh_weights(mesh: Mesh):
+    """Vertex group weights as COO `(rows, cols, weights)`, read through a bmesh deform layer."""
+    bm = bmesh.new()
+    try:
+        bm.from_mesh(mesh)
+        deform = bm.verts.layers.deform.active
+        deform_verts = [] if deform is None else [v[deform] for v in bm.verts]
+        counts = np.fromiter(map(len, deform_verts), dtype=np.int64, count=len(deform_verts))
+        num_weights = int(counts.sum())
+        # `keys()` and `values()` of whole vertices are much faster than iterating `Mesh.vertices[i].groups`
+        cols = np.fromiter(chain.from_iterable(dv.keys() for dv in deform_verts), dtype=np.int64, count=num_weights)
+        weights = np.fromiter(chain.from_iterable(dv.values() for dv in deform_verts), np.float32, count=num_weights)
+    finally:
+        bm.free()
+    return np.repeat(np.arange(len(counts)), counts), cols, weights
+
+
+def _set_mesh_weights(mesh: Mesh, rows: np.ndarray, cols: np.ndarray, weights: np.ndarray):
+    """
+    Set vertex group weights (`cols` are vertex group indices) through a bmesh deform layer: unlike
+    `VertexGroup.add()`, which takes one weight per call, the cost does not grow with the number of distinct weights.
+    """
+    co = np.empty(len(mesh.vertices) * 3, dtype=np.float32)
+    mesh.vertices.foreach_get("co", co)
+    bm = bmesh.new()
+    try:
+        # read the basis shape key, so that `to_mesh()` finds it unchanged and leaves all shape keys as they are
+        bm.from_mesh(mesh, use_shape_key=mesh.shape_keys is not None, shape_key_index=0)
+        deform = bm.verts.layers.deform.verify()
+        deform_verts = [v[deform] for v in bm.verts]
+        for row, col, weight in zip(rows.tolist(), cols.tolist(), weights.tolist()):
+            deform_verts[row][col] = weight
+        bm.to_mesh(mesh)
+    finally:
+        bm.free()
+    # the vertices may not match the basis shape key
+    mesh.vertices.foreach_set("co", co)
+
+
+def _compress_sparse_weights(
+    rows: np.ndarray, cols: np.ndarray, weights: np.ndarray, num_vertices: int, num_bones: int, k: int, quantize: str
+):
+    assert num_bones <= np.iinfo(np.int16).max + 1, f"Too many bones for int16 indices: {num_bones}"
+    keep = weights > 0
+    rows, cols, weights = rows[keep], cols[keep], weights[keep]
+    order = np.lexsort((-weights, rows))
+    rows, cols, weights = rows[order], cols[order], weights[order]
+    slots = np.arange(len(rows)) - np.searchsorted(rows, rows)
+    keep = slots < k
+    rows, cols, weights, slots = rows[keep], cols[keep], weights[keep], slots[keep]
+
+    indices = np.zeros((num_vertices, k), dtype=np.int16)
+    compact = np.zeros((num_vertices, k), dtype=np.float64)
+    indices[rows, slots] = cols
+    compact[rows, slots] = weights
+    totals = compact.sum(axis=1, keepdims=True)
+    compact /= np.where(totals > 0, totals, 1.0)
+
+    if quantize == "float16":
+        compact = compact.astype(np.float16)
+    elif quantize == "uint8":
+        quantized = np.round(compact * 255)
+        # put the rounding residual on the largest influence so that each row still sums to 255
+        quantized[:, 0] += np.where(totals[:, 0] > 0, 255 - quantized.sum(axis=1), 0)
+        compact = quantized.astype(np.uint8)
+    else:
+        raise ValueError(f"Invalid quantization: {quantize}")
+    return indices, compact
+
+
+def _dequantize_weights(weights: np.ndarray) -> np.ndarray:
+    if weights.dtype == np.uint8:
+        return weights.astype(np.float32) / 255
+    return weights.astype(np.float32)
+
+
+def compress_weights(weights: np.ndarray, k=4, quantize="float16"):
+    """
+    Keep the `k` largest influences of each vertex in dense `(V, B)` weights.
+    Returns `(V, k)` int16 bone indices (sorted by descending weight, padded with index 0 and weight 0)
+    and `(V, k)` renormalized weights, either float16 or uint8 (`weight * 255`).
+    """
+    rows, cols = np.nonzero(weights)
+    return _compress_sparse_weights(rows, cols, weights[rows, cols], weights.shape[0], weights.shape[1], k, quantize)
+
+
+def decompress_weights(indices: np.ndarray, weights: np.ndarray, num_bones: int) -> np.ndarray:
+    bw = np.zeros((indices.shape[0], num_bones), dtype=np.float32)
+    rows = np.repeat(np.arange(indices.shape[0]), indices.shape[1])
+    np.add.at(bw, (rows, indices.astype(np.int64).ravel()), _dequantize_weights(weights).ravel())
+    return bw
+
+
+def get_compression_error(weights: np.ndarray, indices: np.ndarray, compact_weights: np.ndarray) -> "dict[str, float]":
+    """Error statistics of the compact format against the full `(V, B)` weights (normalized per vertex)."""
+    totals = weights.sum(axis=1, keepdims=True)
+    full = weights / np.where(totals > 0, totals, 1.0)
+    diff = np.abs(decompress_weights(indices, compact_weights, weights.shape[1]) - full)
+    kept = np.take_along_axis(full, indices.astype(np.int64), axis=1)
+    kept[_dequantize_weights(compact_weights) == 0] = 0
+    compact_bytes = indices.nbytes + compact_weights.nbytes
+    return {
+        "max_abs_error": float(diff.max()) if diff.size else 0.0,
+        "mean_l1_error": float(diff.sum(axis=1).mean()) if diff.size else 0.0,
+        "rmse": float(np.sqrt((diff**2).mean())) if diff.size else 0.0,
+        "max_dropped_weight": float((1 - kept.sum(axis=1))[totals[:, 0] > 0].max(initial=0.0)),
+        "compression_ratio": weights.nbytes / compact_bytes if compact_bytes else 0.0,
+    }
+
+
+def get_compact_weights(
+    mesh_obj_list: "list[Object]", bones_idx_dict: "dict[str, int]", k=4, quantize="float16"
+) -> "tuple[np.ndarray, np.ndarray]":
+    """Same as the weights of `get_rest_vertices()`, but in the compact format of `compress_weights()`."""
+    indices_all = []
+    weights_all = []
+    for mesh_obj in mesh_obj_list:
+        indices, weights = VertexWeights.from_mesh(mesh_obj).to_compact(bones_idx_dict, k, quantize)
+        indices_all.append(indices)
+        weights_all.append(weights)
+    if not indices_all:
+        return None, None
+    return np.concatenate(indices_all, axis=0), np.concatenate(weights_all, axis=0)
+
+
 def transfer_weights(source_bone_name: str, target_bone_name: str, mesh_obj_list: "list[Object]"):
     if isinstance(mesh_obj_list, Object):
         mesh_obj_list = [mesh_obj_list]
     for obj in mesh_obj_list:
-        source_group = obj.vertex_groups.get(source_bone_name)
-        if source_group is None:
-            return
-        source_i = source_group.index
-        target_group = obj.vertex_groups.get(target_bone_name)
-        if target_group is None:
-            target_group = obj.vertex_groups.new(name=target_bone_name)
-
-        for v in obj.data.vertices:
-            for g in v.groups:
-                if g.group == source_i:
-                    target_group.add((v.index,), g.weight, "ADD")
-        obj.vertex_groups.remove(source_group)
+        if obj.vertex_groups.get(source_bone_name) is None:
+            continue
+        VertexWeights.from_mesh(obj).merge({source_bone_name: target_bone_name}).to_mesh(obj)
 
 
 def remove_empty_vgroups(mesh_obj_list: "list[Object]"):
@@ -467,39 +1456,322 @@ def remove_empty_vgroups(mesh_obj_list: "list[Object]"):
         mesh_obj_list = [mesh_obj_list]
     for obj in mesh_obj_list:
         vertex_groups = obj.vertex_groups
-        groups = {r: None for r in range(len(vertex_groups))}
-
-        for vert in obj.data.vertices:
-            for vg in vert.groups:
-                i = vg.group
-                if i in groups:
-                    del groups[i]
-
-        lis = list(groups)
-        lis.sort(reverse=True)
-        for i in lis:
-            vertex_groups.remove(vertex_groups[i])
+        used = set(np.unique(VertexWeights.from_mesh(obj).cols).tolist())
+        for i in reversed(range(len(vertex_groups))):
+            if i not in used:
+                vertex_groups.remove(vertex_groups[i])
+    mark_dirty(mesh_obj_list)
 
 
-def set_weights(mesh_obj_list: "list[Object]", weights: np.ndarray, bones_idx_dict: "dict[str, int]"):
+def set_weights(
+    mesh_obj_list: "list[Object]",
+    weights: "np.ndarray | tuple[np.ndarray, np.ndarray]",
+    bones_idx_dict: "dict[str, int]",
+):
+    """`weights` is either dense `(V, B)` or the `(indices, weights)` pair from `compress_weights()`."""
     assert len(mesh_obj_list) > 0, "No mesh object"
+    compact = isinstance(weights, tuple)
     vertices_num = [len(mesh_obj.data.vertices) for mesh_obj in mesh_obj_list]
-    assert sum(vertices_num) == weights.shape[0], "The number of vertices does not match the number of weights"
-    weights_list = np.split(weights, np.cumsum(vertices_num)[:-1])
+    weights_num = weights[0].shape[0] if compact else weights.shape[0]
+    assert sum(vertices_num) == weights_num, "The number of vertices does not match the number of weights"
+    splits = np.cumsum(vertices_num)[:-1]
+    if compact:
+        weights_list = zip(np.split(weights[0], splits), np.split(weights[1], splits))
+    else:
+        weights_list = np.split(weights, splits)
     # assert list(map(len, weights_list)) == vertices_num
     for mesh_obj, bw in zip(mesh_obj_list, weights_list):
-        mesh_data: Mesh = mesh_obj.data
-        mesh_obj.vertex_groups.clear()
-        for bone_name, bone_index in bones_idx_dict.items():
-            group = mesh_obj.vertex_groups.new(name=bone_name)
-            for v in mesh_data.vertices:
-                v_w = bw[v.index, bone_index]
-                if v_w > 1e-3:
-                    group.add([v.index], v_w, "REPLACE")
-        mesh_data.update()
+        if compact:
+            vertex_weights = VertexWeights.from_compact(*bw, bones_idx_dict, threshold=1e-3)
+        else:
+            vertex_weights = VertexWeights.from_dense(bw, bones_idx_dict, threshold=1e-3)
+        vertex_weights.to_mesh(mesh_obj)
     return mesh_obj_list
 
 
+def get_laplacian(verts: np.ndarray, faces: np.ndarray, cotangent=False):
+    """
+    Symmetric edge weights `W` of the mesh graph as row-sorted COO `(rows, cols, data)`,
+    so that the Laplacian is `L = diag(W.sum(1)) - W`.
+    Uniform weights work for any `faces` from `get_faces()`; cotangent weights need triangles
+    (negative weights of obtuse triangles are clamped to zero to keep smoothing stable).
+    """
+    faces = np.asarray(faces, dtype=np.int64)
+    num_vertices = len(verts)
+    if cotangent:
+        assert faces.shape[1] == 3, "Cotangent weights require triangles"
+        rows, cols, data = [], [], []
+        for k in range(3):
+            # the angle at corner `k` is opposite to the edge (i, j)
+            i, j, c = faces[:, (k + 1) % 3], faces[:, (k + 2) % 3], faces[:, k]
+            e0 = verts[i] - verts[c]
+            e1 = verts[j] - verts[c]
+            cross = np.linalg.norm(np.cross(e0, e1), axis=1)
+            cot = (e0 * e1).sum(axis=1) / np.maximum(cross, 1e-12)
+            rows += [i, j]
+            cols += [j, i]
+            data += [0.5 * cot, 0.5 * cot]
+        rows, cols, data = np.concatenate(rows), np.concatenate(cols), np.concatenate(data)
+    else:
+        rows = faces.ravel()
+        cols = np.roll(faces, -1, axis=1).ravel()
+        rows, cols = np.concatenate([rows, cols]), np.concatenate([cols, rows])
+        data = None
+
+    key, inverse = np.unique(rows * num_vertices + cols, return_inverse=True)
+    if data is None:
+        data = np.ones(len(key))
+    else:
+        data = np.maximum(np.bincount(inverse.reshape(-1), weights=data), 0.0)
+    rows, cols = np.divmod(key, num_vertices)
+    return rows, cols, data
+
+
+def _laplacian_adjacency_apply(laplacian, x: np.ndarray) -> np.ndarray:
+    """`W @ x` for dense `(V, C)` arrays."""
+    rows, cols, data = laplacian
+    # one bincount per contiguous column is much faster than `np.add.at()` / `np.add.reduceat()` on 2D arrays
+    columns = [np.bincount(rows, weights=data * x_c[cols], minlength=len(x)) for x_c in np.ascontiguousarray(x.T)]
+    return np.stack(columns, axis=1) if columns else np.zeros_like(x)
+
+
+def _laplacian_degrees(laplacian, num_vertices: int) -> np.ndarray:
+    rows, _, data = laplacian
+    return np.bincount(rows, weights=data, minlength=num_vertices)
+
+
+def _csr_entries(indptr: np.ndarray, vertices: np.ndarray):
+    """Indices of the CSR entries of the rows `vertices`, row after row, and the number of entries per row."""
+    starts = indptr[vertices]
+    counts = indptr[vertices + 1] - starts
+    offsets = np.cumsum(counts) - counts
+    return np.repeat(starts - offsets, counts) + np.arange(counts.sum()), counts
+
+
+class _SupportOperator:
+    """
+    The adjacency `W` of `get_laplacian()` restricted to `(vertex, group)` pairs: the vertices of each group
+    with a nonzero weight and the ones within `rings` edges of them. Values outside the pairs are zero.
+    """
+
+    def __init__(self, laplacian, vertex_weights: VertexWeights, rings: int, mask: np.ndarray = None):
+        rows, cols, data = laplacian
+        num_vertices = vertex_weights.num_vertices
+        num_groups = len(vertex_weights.names)
+        indptr = np.zeros(num_vertices + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=num_vertices), out=indptr[1:])
+        # per-vertex scratch arrays, reset after each group
+        visited = np.zeros(num_vertices, dtype=bool)
+        position = np.full(num_vertices, -1, dtype=np.int64)
+
+        order = np.argsort(vertex_weights.cols, kind="stable")
+        splits = np.cumsum(np.bincount(vertex_weights.cols, minlength=num_groups))[:-1]
+        vertices_all, distances_all, values_all, entries_all, neighbors_all, counts_all = [], [], [], [], [], []
+        self.truncated = np.zeros(num_groups, dtype=bool)
+        offset = 0
+        for group, (seeds, weights) in enumerate(
+            zip(np.split(vertex_weights.rows[order], splits), np.split(vertex_weights.weights[order], splits))
+        ):
+            # breadth-first dilation of the support, ring by ring
+            layers = [np.unique(seeds)]
+            visited[layers[0]] = True
+            for _ in range(rings):
+                entries, _ = _csr_entries(indptr, layers[-1])
+                ring = cols[entries]
+                ring = np.unique(ring[~visited[ring]])
+                if len(ring) == 0:
+                    break
+                visited[ring] = True
+                layers.append(ring)
+            else:
+                self.truncated[group] = len(layers) > 1
+            vertices = np.concatenate(layers)
+            visited[vertices] = False
+
+            position[vertices] = np.arange(offset, offset + len(vertices))
+            values = np.zeros(len(vertices))
+            values[position[seeds] - offset] = weights
+            entries, counts = _csr_entries(indptr, vertices)
+            entries_all.append(entries)
+            neighbors_all.append(position[cols[entries]])
+            position[vertices] = -1
+
+            vertices_all.append(vertices)
+            distances_all.append(np.repeat(np.arange(len(layers)), [len(layer) for layer in layers]))
+            values_all.append(values)
+            counts_all.append(counts)
+            offset += len(vertices)
+
+        def concatenate(arrays, dtype):
+            return np.concatenate(arrays) if arrays else np.zeros(0, dtype=dtype)
+
+        self.rings = rings
+        self.vertices = concatenate(vertices_all, np.int64)
+        sizes = np.array([len(vertices) for vertices in vertices_all], dtype=np.int64)
+        self.groups = np.repeat(np.arange(len(vertices_all)), sizes)
+        # the pairs of each group are contiguous
+        self.has_pairs = sizes > 0
+        self.group_starts = (np.cumsum(sizes) - sizes)[self.has_pairs]
+        self.distances = concatenate(distances_all, np.int64)
+        self.values = concatenate(values_all, np.float64)
+        self.num_groups = num_groups
+        # neighbors outside the pairs read the zero appended after the values
+        neighbors = concatenate(neighbors_all, np.int64)
+        self.neighbors = np.where(neighbors >= 0, neighbors, len(self.vertices))
+        counts = concatenate(counts_all, np.int64)
+        self.weights = data[concatenate(entries_all, np.int64)]
+        self.nonempty = counts > 0
+        self.starts = (np.cumsum(counts) - counts)[self.nonempty]
+        self.degrees = _laplacian_degrees(laplacian, num_vertices)[self.vertices]
+        self.free = np.ones(len(self.vertices), dtype=bool) if mask is None else np.asarray(mask, dtype=bool)[self.vertices]
+
+    def adjacency_apply(self, x: np.ndarray) -> np.ndarray:
+        out = np.zeros_like(x)
+        if len(self.weights):
+            out[self.nonempty] = np.add.reduceat(self.weights * np.append(x, 0.0)[self.neighbors], self.starts)
+        return out
+
+    def dot(self, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+        """Per-group inner products."""
+        out = np.zeros(self.num_groups)
+        if len(a):
+            out[self.has_pairs] = np.add.reduceat(a * b, self.group_starts)
+        return out
+
+
+def _smooth_support(operator: _SupportOperator, iterations: int, factor: float) -> np.ndarray:
+    """`smooth_vertex_data()` on the pairs of `operator`, which is exact for up to `operator.rings` iterations."""
+    has_neighbors = operator.degrees > 0
+    degrees = np.where(has_neighbors, operator.degrees, 1.0)
+    smooth = has_neighbors & operator.free
+    x = operator.values
+    for _ in range(iterations):
+        average = operator.adjacency_apply(x) / degrees
+        x = np.where(smooth, (1 - factor) * x + factor * average, x)
+    return x
+
+
+def _diffuse_support(operator: _SupportOperator, time: float, tol=1e-6, max_iter=500) -> np.ndarray:
+    """`diffuse_vertex_data()` on the pairs of `operator`, with a zero boundary around them."""
+    x = operator.values
+    free = operator.free
+
+    def apply(y):
+        return (1 + time * operator.degrees) * y - time * operator.adjacency_apply(y)
+
+    fixed = np.where(free, 0.0, x)
+    b = np.where(free, x - apply(fixed), 0.0)
+    precond = 1 / (1 + time * operator.degrees)
+
+    y = np.where(free, x, 0.0)
+    r = b - np.where(free, apply(y), 0.0)
+    z = precond * r
+    p = z.copy()
+    rz = operator.dot(r, z)
+    b_norm = np.sqrt(operator.dot(b, b))
+    for _ in range(max_iter):
+        if np.all(np.sqrt(operator.dot(r, r)) <= tol * np.maximum(b_norm, 1e-30)):
+            break
+        ap = np.where(free, apply(p), 0.0)
+        alpha = rz / np.maximum(operator.dot(p, ap), 1e-30)
+        y += alpha[operator.groups] * p
+        r -= alpha[operator.groups] * ap
+        z = precond * r
+        rz_new = operator.dot(r, z)
+        p = z + (rz_new / np.maximum(rz, 1e-30))[operator.groups] * p
+        rz = rz_new
+    return y + fixed
+
+
+def smooth_vertex_data(laplacian, x: np.ndarray, iterations=10, factor=0.5, mask: np.ndarray = None) -> np.ndarray:
+    """Explicit Laplacian smoothing of `(V, C)` per-vertex data. Vertices outside `mask` stay fixed."""
+    degrees = _laplacian_degrees(laplacian, len(x))[:, None]
+    has_neighbors = degrees > 0
+    degrees = np.where(has_neighbors, degrees, 1.0)
+    x0 = x
+    for _ in range(iterations):
+        average = _laplacian_adjacency_apply(laplacian, x) / degrees
+        x = np.where(has_neighbors, (1 - factor) * x + factor * average, x)
+        if mask is not None:
+            x[~mask] = x0[~mask]
+    return x
+
+
+def diffuse_vertex_data(
+    laplacian, x: np.ndarray, time=1.0, mask: np.ndarray = None, tol=1e-6, max_iter=500
+) -> np.ndarray:
+    """
+    Implicit heat diffusion of `(V, C)` per-vertex data by solving `(I + time * L) y = x`
+    with Jacobi-preconditioned conjugate gradients. Vertices outside `mask` are fixed (Dirichlet) values.
+    """
+    degrees = _laplacian_degrees(laplacian, len(x))[:, None]
+    free = np.ones((len(x), 1), dtype=bool) if mask is None else np.asarray(mask).reshape(-1, 1)
+
+    def apply(y):
+        return (1 + time * degrees) * y - time * _laplacian_adjacency_apply(laplacian, y)
+
+    fixed = np.where(free, 0.0, x)
+    b = np.where(free, x - apply(fixed), 0.0)
+    precond = 1 / (1 + time * degrees)
+
+    y = np.where(free, x, 0.0)
+    r = b - np.where(free, apply(y), 0.0)
+    z = precond * r
+    p = z.copy()
+    rz = (r * z).sum(axis=0)
+    b_norm = np.linalg.norm(b, axis=0)
+    for _ in range(max_iter):
+        if np.all(np.linalg.norm(r, axis=0) <= tol * np.maximum(b_norm, 1e-30)):
+            break
+        ap = np.where(free, apply(p), 0.0)
+        alpha = rz / np.maximum((p * ap).sum(axis=0), 1e-30)
+        y += alpha * p
+        r -= alpha * ap
+        z = precond * r
+        rz_new = (r * z).sum(axis=0)
+        p = z + (rz_new / np.maximum(rz, 1e-30)) * p
+        rz = rz_new
+    return y + fixed
+
+
+def smooth_weights(
+    mesh_obj: Object,
+    iterations=10,
+    factor=0.5,
+    diffusion_time: float = None,
+    cotangent=False,
+    mask: np.ndarray = None,
+    normalize=True,
+    threshold=1e-3,
+    write=True,
+) -> VertexWeights:
+    """
+    Smooth all vertex groups of a mesh at once on the mesh topology: `iterations` explicit smoothing steps,
+    or heat diffusion if `diffusion_time` is given. `mask` is a boolean `(V,)` array of vertices allowed to change.
+    """
+    # all groups are kept, including empty ones, and locked groups are left as they are
+    vertex_weights = VertexWeights.from_mesh(mesh_obj)
+    locked = [vg.name for vg in mesh_obj.vertex_groups if vg.lock_weight]
+    laplacian = get_laplacian(get_vertices(mesh_obj), get_faces(mesh_obj), cotangent=cotangent)
+    vertex_weights.smooth(
+        laplacian,
+        iterations=iterations,
+        factor=factor,
+        diffusion_time=diffusion_time,
+        mask=mask,
+        cutoff=threshold * 0.1,
+        locked=locked,
+    )
+    if normalize:
+        vertex_weights.normalize(locked)
+    vertex_weights.prune(threshold, locked)
+    if normalize:
+        vertex_weights.normalize(locked)
+    if write:
+        vertex_weights.to_mesh(mesh_obj)
+    return vertex_weights
+
+
 def get_pose_vertices(mesh_obj_list: "list[Object]"):
     verts_deformed_all = []
     for mesh_obj in mesh_obj_list:
@@ -509,6 +1781,445 @@ def get_pose_vertices(mesh_obj_list: "list[Object]"):
     return verts_deformed_all
 
 
+def _format_columns(values: np.ndarray, decimals=6) -> np.ndarray:
+    """
+    Format `(N, C)` numbers as fixed-point text, vectorized over the digits instead of the values.
+    Returns `(N, C * W)` characters (uint8), each field right-aligned and starting with a space.
+    """
+    values = np.asarray(values)
+    assert np.isfinite(values).all(), "Cannot format non-finite values"
+    num_rows, num_cols = values.shape
+    flat = values.ravel()
+    scaled = np.round(np.abs(flat) * 10**decimals)
+    scaled = scaled.astype(np.uint32 if scaled.max(initial=0) < 2**32 else np.uint64)
+    negative = np.flatnonzero((flat < 0) & (scaled > 0))
+    powers = 10 ** np.arange(1, 20, dtype=np.uint64)
+    # at least one digit before the dot
+    num_digits = np.maximum(np.searchsorted(powers, scaled[negative], side="right") + 1, decimals + 1)
+    total_digits = max(int(np.searchsorted(powers, scaled.max(initial=0), side="right")) + 1, decimals + 1)
+    dot = 1 if decimals else 0
+    # separator, sign, digits and dot
+    width = 2 + total_digits + dot
+    chars = np.full((len(flat), width), ord(" "), dtype=np.uint8)
+    column = width - 1
+    for p in range(total_digits):
+        if decimals and p == decimals:
+            chars[:, column] = ord(".")
+            column -= 1
+        blank = scaled == 0
+        scaled, digits = np.divmod(scaled, 10)
+        chars[:, column] = digits + ord("0")
+        if p > decimals:
+            # leading zeros become blanks (ord("0") - 16 == ord(" "))
+            chars[:, column] -= blank.view(np.uint8) << 4
+        column -= 1
+    chars[negative, width - 1 - dot - num_digits] = ord("-")
+    return chars.reshape(num_rows, num_cols * width)
+
+
+def _format_lines(keyword: str, values: np.ndarray, decimals=6) -> bytes:
+    chars = _format_columns(values, decimals)
+    keyword = np.frombuffer(keyword.encode("ascii"), dtype=np.uint8)
+    lines = np.empty((chars.shape[0], len(keyword) + chars.shape[1] + 1), dtype=np.uint8)
+    lines[:, : len(keyword)] = keyword
+    lines[:, len(keyword) : -1] = chars
+    lines[:, -1] = ord("\n")
+    return lines.tobytes()
+
+
+def export_ply(filepath: str, verts: np.ndarray, faces: np.ndarray = None):
+    """Write vertices and faces (e.g. from `get_rest_vertices()` or `get_pose_vertices()`) as binary PLY."""
+    verts = np.ascontiguousarray(verts, dtype="<f4")
+    faces = np.zeros((0, 3), dtype=np.int64) if faces is None else np.asarray(faces)
+    face_data = np.empty(len(faces), dtype=[("count", "u1"), ("vertices", "<i4", (faces.shape[1],))])
+    face_data["count"] = faces.shape[1]
+    face_data["vertices"] = faces
+    header = (
+        "ply\nformat binary_little_endian 1.0\n"
+        f"element vertex {len(verts)}\nproperty float x\nproperty float y\nproperty float z\n"
+        f"element face {len(faces)}\nproperty list uchar int vertex_indices\nend_header\n"
+    )
+    with open(filepath, "wb") as f:
+        f.write(b"".join((header.encode("ascii"), verts.tobytes(), face_data.tobytes())))
+
+
+def export_obj(filepath: str, verts: np.ndarray, faces: np.ndarray = None, decimals=6):
+    """Write vertices and faces as OBJ, formatted without per-vertex Python code."""
+    chunks = [_format_lines("v", verts, decimals)]
+    if faces is not None and len(faces):
+        chunks.append(_format_lines("f", np.asarray(faces) + 1, decimals=0))
+    with open(filepath, "wb") as f:
+        f.write(b"".join(chunks))
+
+
+def export_glb(
+    filepath: str,
+    verts: np.ndarray,
+    faces: np.ndarray,
+    weights: "np.ndarray | tuple[np.ndarray, np.ndarray]" = None,
+    armature_index: ArmatureIndex = None,
+    k=4,
+):
+    """
+    Write a mesh as binary glTF, skinned to the rest pose of `armature_index` if `weights` are given, either dense
+    `(V, B)` as from `get_rest_vertices()` or compact as from `get_compact_weights()` (only the `k` largest
+    influences are kept). Vertices are expected in the armature space, as the joints.
+    """
+    # glTF is Y-up, Blender is Z-up
+    z_up_to_y_up = np.array([[1, 0, 0], [0, 0, 1], [0, -1, 0]], dtype=np.float64)
+    verts = verts @ z_up_to_y_up.T
+    # (data, componentType, type, target)
+    arrays = [
+        (verts.astype("<f4"), 5126, "VEC3", 34962),
+        (np.asarray(faces, dtype="<u4").ravel(), 5125, "SCALAR", 34963),
+    ]
+    attributes = {"POSITION": 0}
+    gltf = {"asset": {"version": "2.0", "generator": "bu"}, "scene": 0}
+    nodes: "list[dict]" = []
+    if weights is not None:
+        assert armature_index is not None, "Joints are required for skinning"
+        if isinstance(weights, tuple):
+            indices, compact = weights[0].astype(np.int64), _dequantize_weights(weights[1])
+            assert indices.shape[1] <= 4, "Only 4 influences per vertex are supported"
+        else:
+            indices, compact = compress_weights(weights, k=min(k, 4))
+            compact = _dequantize_weights(compact)
+        joints = np.zeros((len(verts), 4), dtype="<u2")
+        joint_weights = np.zeros((len(verts), 4), dtype="<f4")
+        joints[:, : indices.shape[1]] = indices
+        joint_weights[:, : indices.shape[1]] = compact
+        attributes.update(JOINTS_0=2, WEIGHTS_0=3)
+
+        conversion = np.eye(4)
+        conversion[:3, :3] = z_up_to_y_up
+        rest = conversion @ armature_index.rest_matrices @ conversion.T
+        parents = armature_index.parents
+        local = rest.copy()
+        has_parent = parents >= 0
+        local[has_parent] = np.linalg.inv(rest[parents[has_parent]]) @ rest[has_parent]
+        inverse_bind = np.linalg.inv(rest)
+        arrays += [
+            (joints, 5123, "VEC4", 34962),
+            (joint_weights, 5126, "VEC4", 34962),
+            # glTF matrices are column-major
+            (inverse_bind.transpose(0, 2, 1).astype("<f4"), 5126, "MAT4", None),
+        ]
+        for i, name in enumerate(armature_index.names):
+            node = {"name": name, "matrix": local[i].T.ravel().tolist()}
+            children = np.flatnonzero(parents == i).tolist()
+            if children:
+                node["children"] = children
+            nodes.append(node)
+        gltf["skins"] = [{"joints": list(range(len(nodes))), "inverseBindMatrices": 4}]
+    roots = [i for i, node in enumerate(nodes) if armature_index.parents[i] < 0]
+    mesh_node = {"name": "Mesh", "mesh": 0}
+    if nodes:
+        mesh_node["skin"] = 0
+    nodes.append(mesh_node)
+    gltf.update(
+        scenes=[{"nodes": roots + [len(nodes) - 1]}],
+        nodes=nodes,
+        meshes=[{"primitives": [{"attributes": attributes, "indices": 1, "mode": 4}]}],
+    )
+
+    buffer_views = []
+    accessors = []
+    chunks = []
+    offset = 0
+    for data, component_type, type, target in arrays:
+        data_bytes = np.ascontiguousarray(data).tobytes()
+        buffer_view = {"buffer": 0, "byteOffset": offset, "byteLength": len(data_bytes)}
+        if target is not None:
+            buffer_view["target"] = target
+        accessor = {"bufferView": len(buffer_views), "componentType": component_type, "count": len(data), "type": type}
+        if len(accessors) == 0:
+            accessor.update(min=data.min(axis=0).tolist(), max=data.max(axis=0).tolist())
+        buffer_views.append(buffer_view)
+        accessors.append(accessor)
+        # every view starts 4-byte aligned
+        chunks.append(data_bytes + b"\0" * (-len(data_bytes) % 4))
+        offset += len(chunks[-1])
+    gltf.update(accessors=accessors, bufferViews=buffer_views, buffers=[{"byteLength": offset}])
+
+    json_bytes = json.dumps(gltf, separators=(",", ":")).encode("utf-8")
+    json_bytes += b" " * (-len(json_bytes) % 4)
+    length = 12 + 8 + len(json_bytes) + 8 + offset
+    header = np.array([0x46546C67, 2, length, len(json_bytes), 0x4E4F534A], dtype="<u4").tobytes()
+    bin_header = np.array([offset, 0x004E4942], dtype="<u4").tobytes()
+    with open(filepath, "wb") as f:
+        f.write(b"".join([header, json_bytes, bin_header] + chunks))
+
+
+SNAPSHOT_VERSION = 1
+_SNAPSHOT_KEY_ATTRS = ("co", "handle_left", "handle_right")
+_SNAPSHOT_KEY_ENUMS = ("interpolation", "handle_left_type", "handle_right_type", "easing")
+
+
+def _foreach_get_array(collection, attr: str, dtype, size=1) -> np.ndarray:
+    data = np.empty(len(collection) * size, dtype=dtype)
+    collection.foreach_get(attr, data)
+    return data.reshape(-1, size) if size > 1 else data
+
+
+def _save_mesh(mesh: Mesh, key: str, arrays: "dict[str, np.ndarray]") -> dict:
+    arrays[f"{key}_co"] = _foreach_get_array(mesh.vertices, "co", np.float32, 3)
+    arrays[f"{key}_edges"] = _foreach_get_array(mesh.edges, "vertices", np.int32, 2)
+    arrays[f"{key}_loop_starts"] = _foreach_get_array(mesh.polygons, "loop_start", np.int32)
+    arrays[f"{key}_loop_vertices"] = _foreach_get_array(mesh.loops, "vertex_index", np.int32)
+    arrays[f"{key}_loop_edges"] = _foreach_get_array(mesh.loops, "edge_index", np.int32)
+    info = {"name": mesh.name, "shape_keys": []}
+    if mesh.shape_keys:
+        key_blocks = mesh.shape_keys.key_blocks
+        arrays[f"{key}_shape_keys"] = np.stack(
+            [_foreach_get_array(kb.points, "co", np.float32, 3) for kb in key_blocks]
+        )
+        info["shape_keys"] = [
+            {
+                "name": kb.name,
+                "relative_key": kb.relative_key.name,
+                "value": kb.value,
+                "slider_min": kb.slider_min,
+                "slider_max": kb.slider_max,
+                "mute": kb.mute,
+            }
+            for kb in key_blocks
+        ]
+    return info
+
+
+def _load_mesh(info: dict, key: str, load) -> Mesh:
+    mesh = bpy.data.meshes.new(info["name"])
+    co, edges, loop_vertices = load(f"{key}_co"), load(f"{key}_edges"), load(f"{key}_loop_vertices")
+    loop_starts = load(f"{key}_loop_starts")
+    mesh.vertices.add(len(co))
+    mesh.vertices.foreach_set("co", co.ravel())
+    mesh.edges.add(len(edges))
+    mesh.edges.foreach_set("vertices", edges.ravel())
+    mesh.loops.add(len(loop_vertices))
+    mesh.loops.foreach_set("vertex_index", loop_vertices)
+    mesh.loops.foreach_set("edge_index", load(f"{key}_loop_edges"))
+    mesh.polygons.add(len(loop_starts))
+    mesh.polygons.foreach_set("loop_start", loop_starts)
+    mesh.update()
+    return mesh
+
+
+def _save_armature(armature_obj: Object, key: str, arrays: "dict[str, np.ndarray]") -> dict:
+    armature_index = get_armature_index(armature_obj)
+    bones = armature_obj.data.bones
+    head = _foreach_get_array(bones, "head_local", np.float32, 3)
+    tail = _foreach_get_array(bones, "tail_local", np.float32, 3)
+    arrays[f"{key}_head"] = head
+    arrays[f"{key}_tail"] = tail
+    arrays[f"{key}_roll"] = _get_roll_from_matrix(head, tail, armature_index.rest_matrices).astype(np.float32)
+    arrays[f"{key}_parents"] = armature_index.parents
+    arrays[f"{key}_use_connect"] = _foreach_get_array(bones, "use_connect", bool)
+    arrays[f"{key}_use_deform"] = _foreach_get_array(bones, "use_deform", bool)
+    return {"name": armature_obj.data.name, "bones": armature_index.names}
+
+
+def _load_armature_bones(armature_obj: Object, info: dict, key: str, load):
+    """Create the bones of an armature (in edit mode)."""
+    edit_bones = armature_obj.data.edit_bones
+    for name in info["bones"]:
+        edit_bones.new(name)
+    for i, parent in enumerate(load(f"{key}_parents").tolist()):
+        if parent >= 0:
+            edit_bones[i].parent = edit_bones[parent]
+    edit_bones.foreach_set("head", load(f"{key}_head").ravel())
+    edit_bones.foreach_set("tail", load(f"{key}_tail").ravel())
+    edit_bones.foreach_set("roll", load(f"{key}_roll"))
+    edit_bones.foreach_set("use_deform", load(f"{key}_use_deform"))
+    # connected heads are snapped to the parent tails, which they already match
+    edit_bones.foreach_set("use_connect", load(f"{key}_use_connect"))
+
+
+def _save_action(action: Action, key: str, arrays: "dict[str, np.ndarray]") -> dict:
+    fcurves = list(_iter_action_fcurves(action))
+    for attr in _SNAPSHOT_KEY_ATTRS + _SNAPSHOT_KEY_ENUMS:
+        dtype, size = (np.float32, 2) if attr in _SNAPSHOT_KEY_ATTRS else (np.int32, 1)
+        data = [_foreach_get_array(fcurve.keyframe_points, attr, dtype, size) for fcurve in fcurves]
+        arrays[f"{key}_{attr}"] = np.concatenate(data) if data else np.empty((0, size), dtype=dtype)
+    return {
+        "name": action.name,
+        "fcurves": [
+            [fcurve.data_path, fcurve.array_index, fcurve.group.name if fcurve.group else ""] for fcurve in fcurves
+        ],
+        "num_keys": [len(fcurve.keyframe_points) for fcurve in fcurves],
+    }
+
+
+def _load_action(info: dict, key: str, load, slot_name: str) -> Action:
+    action = bpy.data.actions.new(info["name"])
+    slot = action.slots.new(id_type="OBJECT", name=slot_name) if hasattr(action, "slots") else None
+    fcurves = get_action_fcurves(action, slot, ensure=True)
+    data = {attr: load(f"{key}_{attr}") for attr in _SNAPSHOT_KEY_ATTRS + _SNAPSHOT_KEY_ENUMS}
+    ends = np.cumsum(info["num_keys"]).tolist()
+    for (data_path, index, group_name), end, num_keys in zip(info["fcurves"], ends, info["num_keys"]):
+        keyframe_points = _new_fcurve(fcurves, data_path, index, group_name).keyframe_points
+        keyframe_points.add(num_keys)
+        for attr, values in data.items():
+            keyframe_points.foreach_set(attr, values[end - num_keys : end].ravel())
+    return action
+
+
+def _load_shape_keys(mesh_obj: Object, info: dict, key: str, load):
+    if not info["shape_keys"]:
+        return
+    shape_keys = load(f"{key}_shape_keys")
+    for kb_info, co in zip(info["shape_keys"], shape_keys):
+        kb = mesh_obj.shape_key_add(name=kb_info["name"], from_mix=False)
+        kb.points.foreach_set("co", co.ravel())
+        kb.slider_min = kb_info["slider_min"]
+        kb.slider_max = kb_info["slider_max"]
+        kb.value = kb_info["value"]
+        kb.mute = kb_info["mute"]
+    key_blocks = mesh_obj.data.shape_keys.key_blocks
+    for kb_info in info["shape_keys"]:
+        key_blocks[kb_info["name"]].relative_key = key_blocks[kb_info["relative_key"]]
+
+
+def save_snapshot(dirpath: str, obj_list: "list[Object]" = None):
+    """
+    Save objects (default: all objects in the scene) to a snapshot directory for `load_snapshot()`, which is much
+    faster than importing the original file again: a `manifest.json` with one memory-mappable `.npy` file per array.
+    Covers what `bu` works with: mesh geometry, vertex groups and shape keys, armature rest bones, empties,
+    parenting, Armature modifiers and actions (not materials, UVs nor custom properties).
+    """
+    if not obj_list:
+        obj_list = list(bpy.context.scene.objects)
+    manifest = {"version": SNAPSHOT_VERSION, "objects": [], "meshes": {}, "armatures": {}, "actions": {}}
+    arrays: "dict[str, np.ndarray]" = {}
+    data_keys: "dict[bpy.types.ID, str]" = {}
+    matrices = []
+    for obj in obj_list:
+        if obj.type not in ("MESH", "ARMATURE", "EMPTY"):
+            print(f"Skipping `{obj.name}`: unsupported type {obj.type}")
+            continue
+        entry = {
+            "name": obj.name,
+            "type": obj.type,
+            "data": None,
+            "parent": obj.parent.name if obj.parent in obj_list else None,
+            "parent_type": obj.parent_type,
+            "parent_bone": obj.parent_bone,
+            "rotation_mode": obj.rotation_mode,
+            "modifiers": [
+                {
+                    "name": mod.name,
+                    "object": mod.object.name if mod.object else None,
+                    "use_vertex_groups": mod.use_vertex_groups,
+                    "use_bone_envelopes": mod.use_bone_envelopes,
+                    "use_deform_preserve_volume": mod.use_deform_preserve_volume,
+                }
+                for mod in obj.modifiers
+                if mod.type == "ARMATURE"
+            ],
+            "action": None,
+        }
+        matrices.append((np.array(obj.matrix_basis), np.array(obj.matrix_parent_inverse)))
+        if obj.data is not None and obj.data not in data_keys:
+            if obj.type == "MESH":
+                key = data_keys[obj.data] = f"mesh{len(manifest['meshes'])}"
+                manifest["meshes"][key] = _save_mesh(obj.data, key, arrays)
+            else:
+                key = data_keys[obj.data] = f"armature{len(manifest['armatures'])}"
+                manifest["armatures"][key] = _save_armature(obj, key, arrays)
+        if obj.data is not None:
+            entry["data"] = data_keys[obj.data]
+        if obj.type == "MESH":
+            vertex_weights = VertexWeights.from_mesh(obj)
+            key = f"object{len(manifest['objects'])}"
+            arrays[f"{key}_vg_rows"] = vertex_weights.rows.astype(np.int32)
+            arrays[f"{key}_vg_cols"] = vertex_weights.cols.astype(np.int32)
+            arrays[f"{key}_vg_weights"] = vertex_weights.weights
+            entry["vertex_groups"] = vertex_weights.names
+        elif obj.type == "ARMATURE":
+            entry["rotation_modes"] = [pose_bone.rotation_mode for pose_bone in obj.pose.bones]
+        action = obj.animation_data.action if obj.animation_data else None
+        if action is not None:
+            if action not in data_keys:
+                key = data_keys[action] = f"action{len(manifest['actions'])}"
+                manifest["actions"][key] = _save_action(action, key, arrays)
+            entry["action"] = data_keys[action]
+        manifest["objects"].append(entry)
+    arrays["object_matrices"] = np.array(matrices, dtype=np.float32).reshape(-1, 2, 4, 4)
+
+    os.makedirs(dirpath, exist_ok=True)
+    for name, data in arrays.items():
+        np.save(os.path.join(dirpath, f"{name}.npy"), data)
+    with open(os.path.join(dirpath, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1)
+
+
+def load_snapshot(dirpath: str) -> "list[Object]":
+    """Rebuild the objects of a snapshot from `save_snapshot()` with bulk `foreach_set()`, returning them."""
+    with open(os.path.join(dirpath, "manifest.json"), encoding="utf-8") as f:
+        manifest = json.load(f)
+    assert manifest["version"] == SNAPSHOT_VERSION, f"Unsupported snapshot version: {manifest['version']}"
+
+    def load(name: str) -> np.ndarray:
+        # plain views of the maps, `np.memmap` indexing is slow
+        return np.asarray(np.load(os.path.join(dirpath, f"{name}.npy"), mmap_mode="r"))
+
+    data_blocks = {key: _load_mesh(info, key, load) for key, info in manifest["meshes"].items()}
+    data_blocks.update({key: bpy.data.armatures.new(info["name"]) for key, info in manifest["armatures"].items()})
+    collection = bpy.context.scene.collection
+    objs: "dict[str, Object]" = {}
+    for entry in manifest["objects"]:
+        obj = bpy.data.objects.new(entry["name"], data_blocks[entry["data"]] if entry["data"] else None)
+        collection.objects.link(obj)
+        # names may be taken in the current file
+        objs[entry["name"]] = obj
+
+    armature_entries = [entry for entry in manifest["objects"] if entry["type"] == "ARMATURE"]
+    built = {}
+    for entry in armature_entries:
+        built.setdefault(entry["data"], objs[entry["name"]])
+    if built:
+        with Mode("EDIT", list(built.values())):
+            for key, armature_obj in built.items():
+                _load_armature_bones(armature_obj, manifest["armatures"][key], key, load)
+
+    matrices = load("object_matrices")
+    weighted = set()
+    actions: "dict[str, Action]" = {}
+    for i, (entry, (matrix_basis, matrix_parent_inverse)) in enumerate(zip(manifest["objects"], matrices)):
+        obj = objs[entry["name"]]
+        obj.rotation_mode = entry["rotation_mode"]
+        if entry["parent"] is not None:
+            obj.parent = objs[entry["parent"]]
+            obj.parent_type = entry["parent_type"]
+            obj.parent_bone = entry["parent_bone"]
+        obj.matrix_parent_inverse = mathutils.Matrix(matrix_parent_inverse.tolist())
+        obj.matrix_basis = mathutils.Matrix(matrix_basis.tolist())
+        for mod_info in entry["modifiers"]:
+            mod = obj.modifiers.new(mod_info["name"], "ARMATURE")
+            mod.object = objs.get(mod_info["object"])
+            mod.use_vertex_groups = mod_info["use_vertex_groups"]
+            mod.use_bone_envelopes = mod_info["use_bone_envelopes"]
+            mod.use_deform_preserve_volume = mod_info["use_deform_preserve_volume"]
+        if entry["type"] == "MESH":
+            key = f"object{i}"
+            # weights and group names are stored in the mesh, so objects sharing it are restored once
+            if obj.data not in weighted:
+                for name in entry["vertex_groups"]:
+                    obj.vertex_groups.new(name=name)
+                _set_mesh_weights(obj.data, load(f"{key}_vg_rows"), load(f"{key}_vg_cols"), load(f"{key}_vg_weights"))
+                _load_shape_keys(obj, manifest["meshes"][entry["data"]], entry["data"], load)
+                weighted.add(obj.data)
+        elif entry["type"] == "ARMATURE":
+            for pose_bone, rotation_mode in zip(obj.pose.bones, entry["rotation_modes"]):
+                pose_bone.rotation_mode = rotation_mode
+        if entry["action"] is not None:
+            if entry["action"] not in actions:
+                info = manifest["actions"][entry["action"]]
+                actions[entry["action"]] = _load_action(info, entry["action"], load, obj.name)
+            set_action(obj, actions[entry["action"]])
+    mark_dirty(list(objs.values()))
+    return list(objs.values())
+
+
 def get_shape_keys(mesh_obj: Object, ignore_basis=True, ignore_empty=False):
     if mesh_obj is None:
         return None
@@ -575,10 +2286,16 @@ def set_shape_keys(mesh_obj: Object, shape_keys: dict[str, np.ndarray], clear_ex
 
     mesh_obj.show_only_shape_key = False
     mesh.update()
+    mark_dirty(mesh_obj)
     return mesh
 
 
 def transfer_all_shape_keys(mesh_src: Object, mesh_tgt: Object, clear_existing=True):
+    return run_job(iter_transfer_all_shape_keys(mesh_src, mesh_tgt, clear_existing))
+
+
+def iter_transfer_all_shape_keys(mesh_src: Object, mesh_tgt: Object, clear_existing=True):
+    """Steps of `transfer_all_shape_keys()`, yielding the progress after each shape key."""
     assert mesh_src and mesh_src.type == "MESH"
     assert mesh_tgt and mesh_tgt.type == "MESH"
     if mesh_src.data.shape_keys is None:
@@ -587,13 +2304,16 @@ def transfer_all_shape_keys(mesh_src: Object, mesh_tgt: Object, clear_existing=T
         for kb in mesh_tgt.data.shape_keys.key_blocks[:][::-1]:
             mesh_tgt.shape_key_remove(kb)
     bpy.context.view_layer.objects.active = mesh_tgt
+    num_keys = len(mesh_src.data.shape_keys.key_blocks)
     with Select(mesh_src):
-        for idx in range(1, len(mesh_src.data.shape_keys.key_blocks)):
+        for idx in range(1, num_keys):
             mesh_src.active_shape_key_index = idx
             print(f"Copying Shape Key: {mesh_src.active_shape_key.name}")
             bpy.ops.object.shape_key_transfer()
+            yield idx / num_keys
     mesh_tgt.data.update()
     mesh_tgt.show_only_shape_key = False
+    mark_dirty(mesh_tgt)
     return mesh_tgt
 
 
@@ -604,16 +2324,927 @@ def set_action(armature_obj: Object, action: Action):
     if hasattr(armature_obj.animation_data, "action_slot"):
         # For Blender 4.4 and later
         armature_obj.animation_data.action_slot = armature_obj.animation_data.action_suitable_slots[0]
+    mark_dirty(armature_obj)
     return armature_obj
 
 
-def mesh_quads2tris(obj_list: "list[Object]" = None):
-    if not obj_list:
-        obj_list = bpy.context.scene.objects
-    for obj in obj_list:
-        if obj.type == "MESH":
-            with Mode("EDIT", obj):
-                bpy.ops.mesh.quads_convert_to_tris(quad_method="BEAUTY", ngon_method="BEAUTY")
+_POSE_BONE_PATH = re.compile(r'^pose\.bones\["((?:[^"\\]|\\.)*)"\]\.(\w+)$')
+_POSE_CHANNELS = {"location": 3, "rotation_quaternion": 4, "rotation_euler": 3, "rotation_axis_angle": 4, "scale": 3}
+_POSE_CHANNEL_DEFAULTS = {
+    "location": (0, 0, 0),
+    "rotation_quaternion": (1, 0, 0, 0),
+    "rotation_euler": (0, 0, 0),
+    "rotation_axis_angle": (0, 0, 1, 0),
+    "scale": (1, 1, 1),
+}
+
+
+def get_action_fcurves(action: Action, slot=None, ensure=False):
+    """
+    F-curves of an action. For layered actions (Blender 4.4 and later), the F-curves of `slot` (default: the first
+    one) in the first strip are returned; with `ensure`, the slot, layer, strip and channelbag are created if needed.
+    """
+    if not hasattr(action, "slots"):
+        return action.fcurves
+    if slot is None:
+        if len(action.slots) > 0:
+            slot = action.slots[0]
+        elif ensure:
+            slot = action.slots.new(id_type="OBJECT", name=action.name)
+        else:
+            return []
+    if len(action.layers) == 0:
+        if not ensure:
+            return []
+        action.layers.new("Layer")
+    layer = action.layers[0]
+    if len(layer.strips) == 0:
+        if not ensure:
+            return []
+        layer.strips.new(type="KEYFRAME")
+    channelbag = layer.strips[0].channelbag(slot, ensure=ensure)
+    return channelbag.fcurves if channelbag is not None else []
+
+
+def _new_fcurve(fcurves, data_path: str, index=0, group_name=""):
+    # legacy `Action.fcurves.new()` takes `action_group` instead of `group_name`
+    for kwargs in ({"group_name": group_name}, {"action_group": group_name}, {}):
+        try:
+            return fcurves.new(data_path, index=index, **kwargs)
+        except TypeError:
+            continue
+
+
+def _set_fcurve_keys(fcurve, frames: np.ndarray, values: np.ndarray, replace=True, linear=False):
+    keyframe_points = fcurve.keyframe_points
+    if not replace and len(keyframe_points) > 0:
+        # keep the existing keys on other frames
+        key_frames, key_values = _get_fcurve_keys(fcurve)
+        keep = ~np.isin(key_frames, frames)
+        frames = np.concatenate([key_frames[keep], frames])
+        values = np.concatenate([key_values[keep], values])
+        order = np.argsort(frames, kind="stable")
+        frames, values = frames[order], values[order]
+    keyframe_points.clear()
+    keyframe_points.add(len(frames))
+    co = np.empty((len(frames), 2), dtype=np.float32)
+    co[:, 0] = frames
+    co[:, 1] = values
+    keyframe_points.foreach_set("co", co.ravel())
+    if linear:
+        keyframe_points.foreach_set("interpolation", np.ones(len(frames), dtype=np.int32))
+    fcurve.update()
+    return fcurve
+
+
+def _get_fcurve_keys(fcurve):
+    keyframe_points = fcurve.keyframe_points
+    co = np.empty(len(keyframe_points) * 2, dtype=np.float32)
+    keyframe_points.foreach_get("co", co)
+    return co[0::2], co[1::2]
+
+
+def _sample_fcurve(fcurve, frames: np.ndarray, keys: "tuple[np.ndarray, np.ndarray]" = None) -> np.ndarray:
+    key_frames, key_values = _get_fcurve_keys(fcurve) if keys is None else keys
+    values = np.empty(len(frames), dtype=np.float64)
+    on_key = np.zeros(len(frames), dtype=bool)
+    if len(fcurve.modifiers) == 0 and len(key_frames) > 0:
+        # frames on keys are read directly, only the others need to evaluate the curve
+        idx = np.clip(np.searchsorted(key_frames, frames), 0, len(key_frames) - 1)
+        on_key = key_frames[idx] == frames
+        values[on_key] = key_values[idx[on_key]]
+    values[~on_key] = [fcurve.evaluate(frame) for frame in frames[~on_key]]
+    return values
+
+
+def _parse_pose_bone_path(data_path: str) -> "tuple[str, str] | None":
+    """Bone name and property of a `pose.bones["name"].prop` data path."""
+    match = _POSE_BONE_PATH.match(data_path)
+    if match is None:
+        return None
+    return match.group(1).replace('\\"', '"').replace("\\\\", "\\"), match.group(2)
+
+
+def _iter_pose_fcurves(action: Action, slot=None):
+    """Yield `(bone_name, attr, fcurve)` for the F-curves of pose bone channels in `action`."""
+    for fcurve in get_action_fcurves(action, slot):
+        parsed = _parse_pose_bone_path(fcurve.data_path)
+        if parsed is None or parsed[1] not in _POSE_CHANNELS or fcurve.array_index >= _POSE_CHANNELS[parsed[1]]:
+            continue
+        yield parsed[0], parsed[1], fcurve
+
+
+def _make_quats_continuous(quats: np.ndarray) -> np.ndarray:
+    """Flip the signs of quaternions shaped (F, ..., 4) so that consecutive frames are in the same hemisphere."""
+    flip = np.sum(quats[1:] * quats[:-1], axis=-1) < 0
+    sign = np.cumprod(np.where(flip, -1.0, 1.0), axis=0)
+    return np.concatenate([quats[:1], quats[1:] * sign[..., None]])
+
+
+def _quat_to_mat3(quat: np.ndarray) -> np.ndarray:
+    q = quat / np.maximum(np.linalg.norm(quat, axis=-1, keepdims=True), 1e-30)
+    w, x, y, z = np.moveaxis(q, -1, 0)
+    mat = np.empty(q.shape[:-1] + (3, 3))
+    mat[..., 0, 0] = 1 - 2 * (y * y + z * z)
+    mat[..., 0, 1] = 2 * (x * y - w * z)
+    mat[..., 0, 2] = 2 * (x * z + w * y)
+    mat[..., 1, 0] = 2 * (x * y + w * z)
+    mat[..., 1, 1] = 1 - 2 * (x * x + z * z)
+    mat[..., 1, 2] = 2 * (y * z - w * x)
+    mat[..., 2, 0] = 2 * (x * z - w * y)
+    mat[..., 2, 1] = 2 * (y * z + w * x)
+    mat[..., 2, 2] = 1 - 2 * (x * x + y * y)
+    return mat
+
+
+def _axis_angle_to_mat3(axis_angle: np.ndarray) -> np.ndarray:
+    half = axis_angle[..., :1] * 0.5
+    axis = axis_angle[..., 1:] / np.maximum(np.linalg.norm(axis_angle[..., 1:], axis=-1, keepdims=True), 1e-30)
+    return _quat_to_mat3(np.concatenate([np.cos(half), axis * np.sin(half)], axis=-1))
+
+
+def _euler_to_mat3(euler: np.ndarray, order="XYZ") -> np.ndarray:
+    mat = np.broadcast_to(np.eye(3), euler.shape[:-1] + (3, 3))
+    # the first axis of the order is applied first
+    for axis in order:
+        i = "XYZ".index(axis)
+        j, k = (i + 1) % 3, (i + 2) % 3
+        c, s = np.cos(euler[..., i]), np.sin(euler[..., i])
+        rot = np.zeros(euler.shape[:-1] + (3, 3))
+        rot[..., i, i] = 1
+        rot[..., j, j] = c
+        rot[..., j, k] = -s
+        rot[..., k, j] = s
+        rot[..., k, k] = c
+        mat = rot @ mat
+    return mat
+
+
+def _normalize_mat3(mat: np.ndarray) -> np.ndarray:
+    return mat / np.maximum(np.linalg.norm(mat, axis=-2, keepdims=True), 1e-30)
+
+
+def get_action_channels(
+    armature_obj: Object, action: Action, frames: np.ndarray, slot=None, armature_index: ArmatureIndex = None
+) -> "dict[str, np.ndarray]":
+    """
+    Local channels (`location`, `rotation_quaternion`, ...) of all bones at `frames` when playing `action`,
+    each shaped (F, B, C). Channels without F-curves (or all of them if `action` is None) keep the current values.
+    """
+    if armature_index is None:
+        armature_index = get_armature_index(armature_obj)
+    pose_bones = armature_obj.pose.bones
+    frames = np.asarray(frames, dtype=np.float64)
+    channels = {
+        attr: np.repeat(_foreach_get_vector(pose_bones, attr, size)[None], len(frames), axis=0)
+        for attr, size in _POSE_CHANNELS.items()
+    }
+    for bone_name, attr, fcurve in _iter_pose_fcurves(action, slot) if action is not None else []:
+        i = armature_index.bones_idx_dict.get(bone_name)
+        if i is not None:
+            channels[attr][:, i, fcurve.array_index] = _sample_fcurve(fcurve, frames)
+    return channels
+
+
+def _get_rotation_matrices(channels: "dict[str, np.ndarray]", rotation_modes: np.ndarray) -> np.ndarray:
+    rotation = np.empty(channels["location"].shape + (3,))
+    for mode in np.unique(rotation_modes):
+        mask = rotation_modes == mode
+        if mode == "QUATERNION":
+            rotation[:, mask] = _quat_to_mat3(channels["rotation_quaternion"][:, mask])
+        elif mode == "AXIS_ANGLE":
+            rotation[:, mask] = _axis_angle_to_mat3(channels["rotation_axis_angle"][:, mask])
+        else:
+            rotation[:, mask] = _euler_to_mat3(channels["rotation_euler"][:, mask], mode)
+    return rotation
+
+
+def get_action_basis(
+    armature_obj: Object, action: Action, frames: np.ndarray, slot=None, armature_index: ArmatureIndex = None
+) -> np.ndarray:
+    """`PoseBone.matrix_basis` of all bones at `frames` when playing `action`, shaped (F, B, 4, 4)."""
+    channels = get_action_channels(armature_obj, action, frames, slot, armature_index)
+    rotation_modes = np.array([bone.rotation_mode for bone in armature_obj.pose.bones])
+    basis = np.zeros(channels["location"].shape[:2] + (4, 4))
+    basis[..., :3, :3] = _get_rotation_matrices(channels, rotation_modes) * channels["scale"][..., None, :]
+    basis[..., :3, 3] = channels["location"]
+    basis[..., 3, 3] = 1
+    return basis
+
+
+def get_pose_matrices(armature_obj: Object, basis: np.ndarray, armature_index: ArmatureIndex = None) -> np.ndarray:
+    """
+    Forward kinematics: `PoseBone.matrix` (armature space) of all bones from their `matrix_basis`,
+    shaped (..., B, 4, 4).
+    Assumes the default bone inheritance (no constraints, hinge or local location options).
+    """
+    if armature_index is None:
+        armature_index = get_armature_index(armature_obj)
+    rest = armature_index.rest_matrices
+    parents = armature_index.parents
+    basis = basis.copy()
+    # connected bones ignore their location
+    basis[..., armature_index.connected, :3, 3] = 0
+    # rest matrix relative to the rest parent
+    offset = rest.copy()
+    has_parent = parents >= 0
+    offset[has_parent] = armature_index.rest_matrices_inv[parents[has_parent]] @ rest[has_parent]
+    pose = np.empty_like(basis)
+    for depth, level in enumerate(armature_index.levels):
+        local = offset[level] @ basis[..., level, :, :]
+        pose[..., level, :, :] = local if depth == 0 else pose[..., parents[level], :, :] @ local
+    return pose
+
+
+def retarget_action(
+    source_obj: Object,
+    action: Action,
+    target_obj: Object,
+    bone_map: "dict[str, str]",
+    root_bone: str = None,
+    in_place=False,
+    frame_range: "tuple[int, int]" = None,
+    name: str = None,
+    assign=True,
+) -> Action:
+    """
+    Retarget `action` of `source_obj` to `target_obj` without any add-on.
+    `bone_map` maps source bone names to target bone names, and `root_bone` is the source root bone (a key of
+    `bone_map`) whose motion is transferred, scaled by the ratio of the rest root heights.
+    Both armatures are expected to share the same rest posture (e.g. T-pose): world space rotations of mapped bones
+    relative to their rest poses are copied to the target, and unmapped target bones follow their parents.
+    """
+    source_index = get_armature_index(source_obj)
+    target_index = get_armature_index(target_obj)
+    bone_map = {
+        src: tgt
+        for src, tgt in bone_map.items()
+        if src in source_index.bones_idx_dict and tgt in target_index.bones_idx_dict
+    }
+    assert root_bone is None or root_bone in bone_map, f"Root bone `{root_bone}` is not mapped"
+    src_idx = np.array([source_index.bones_idx_dict[src] for src in bone_map], dtype=np.int64)
+    tgt_idx = np.array([target_index.bones_idx_dict[tgt] for tgt in bone_map.values()], dtype=np.int64)
+    if frame_range is None:
+        frame_range = action.frame_range
+    frames = np.arange(round(frame_range[0]), round(frame_range[1]) + 1, dtype=np.float64)
+
+    source_world = np.array(source_obj.matrix_world)
+    target_world = np.array(target_obj.matrix_world)
+    source_world_rot = _normalize_mat3(source_world[:3, :3])
+    target_world_rot = _normalize_mat3(target_world[:3, :3])
+    # rest alignment: target rest orientation relative to the source rest orientation (world space)
+    source_rest_rot = source_world_rot @ _normalize_mat3(source_index.rest_matrices[src_idx, :3, :3])
+    target_rest_rot = target_world_rot @ _normalize_mat3(target_index.rest_matrices[tgt_idx, :3, :3])
+    alignment = source_rest_rot.transpose(0, 2, 1) @ target_rest_rot
+
+    source_pose = get_pose_matrices(
+        source_obj, get_action_basis(source_obj, action, frames, armature_index=source_index), source_index
+    )
+    # target orientations in armature space, (F, M, 3, 3)
+    target_rot = (
+        target_world_rot.T @ source_world_rot @ _normalize_mat3(source_pose[:, src_idx, :3, :3]) @ alignment
+    )
+
+    # solve the target basis level by level, as the parent poses are needed
+    target_basis = np.broadcast_to(np.eye(4), (len(frames), len(target_index), 4, 4)).copy()
+    target_pose = np.empty_like(target_basis)
+    rest = target_index.rest_matrices
+    parents = target_index.parents
+    mapped = np.full(len(target_index), -1, dtype=np.int64)
+    mapped[tgt_idx] = np.arange(len(tgt_idx))
+    root_location = None
+    if root_bone is not None:
+        src_root = source_index.bones_idx_dict[root_bone]
+        tgt_root = target_index.bones_idx_dict[bone_map[root_bone]]
+        source_root_rest = source_world[:3, :3] @ source_index.rest_heads[src_root] + source_world[:3, 3]
+        target_root_rest = target_world[:3, :3] @ target_index.rest_heads[tgt_root] + target_world[:3, 3]
+        source_root = source_pose[:, src_root, :3, 3] @ source_world[:3, :3].T + source_world[:3, 3]
+        source_height = source_root_rest[2] - source_world[2, 3]
+        target_height = target_root_rest[2] - target_world[2, 3]
+        scale = target_height / source_height if abs(source_height) > 1e-6 else 1.0
+        offset = (source_root - source_root_rest) * scale
+        if in_place:
+            offset[:, :2] = 0
+        root_location = (target_root_rest + offset - target_world[:3, 3]) @ np.linalg.inv(target_world[:3, :3]).T
+    for depth, level in enumerate(target_index.levels):
+        if depth == 0:
+            parent_rest = np.broadcast_to(rest[level], (len(frames),) + rest[level].shape)
+        else:
+            parent_rest = target_pose[:, parents[level]] @ target_index.rest_matrices_inv[parents[level]] @ rest[level]
+        level_mapped = mapped[level]
+        has_map = level_mapped >= 0
+        # rot(basis) = rot(parent_pose @ offset)^(-1) @ rot(pose)
+        parent_rot = _normalize_mat3(parent_rest[:, has_map, :3, :3])
+        parent_rot_inv = parent_rot.transpose(0, 1, 3, 2)
+        target_basis[:, level[has_map], :3, :3] = parent_rot_inv @ target_rot[:, level_mapped[has_map]]
+        if root_location is not None and tgt_root in level:
+            j = np.flatnonzero(level == tgt_root)[0]
+            # pose head = parent_rest @ basis location
+            m = parent_rest[:, j]
+            target_basis[:, tgt_root, :3, 3] = np.einsum(
+                "fij,fj->fi", np.linalg.inv(m[:, :3, :3]), root_location - m[:, :3, 3]
+            )
+        target_pose[:, level] = parent_rest @ target_basis[:, level]
+
+    quats = _mat3_to_quat(target_basis[:, tgt_idx, :3, :3].reshape(-1, 3, 3)).reshape(len(frames), -1, 4)
+    quats = _make_quats_continuous(quats)
+
+    new_action = bpy.data.actions.new(name or f"{action.name}_{target_obj.name}")
+    if hasattr(new_action, "slots"):
+        slot = new_action.slots.new(id_type="OBJECT", name=target_obj.name)
+        fcurves = get_action_fcurves(new_action, slot, ensure=True)
+    else:
+        fcurves = get_action_fcurves(new_action)
+    pose_bones = target_obj.pose.bones
+    for j, i in enumerate(tgt_idx):
+        bone_name = target_index.names[i]
+        pose_bones[bone_name].rotation_mode = "QUATERNION"
+        data_path = pose_bones[bone_name].path_from_id("rotation_quaternion")
+        for k in range(4):
+            _set_fcurve_keys(_new_fcurve(fcurves, data_path, k, bone_name), frames, quats[:, j, k])
+    if root_location is not None:
+        bone_name = target_index.names[tgt_root]
+        data_path = pose_bones[bone_name].path_from_id("location")
+        for k in range(3):
+            _set_fcurve_keys(_new_fcurve(fcurves, data_path, k, bone_name), frames, target_basis[:, tgt_root, k, 3])
+    if assign:
+        set_action(target_obj, new_action)
+    return new_action
+
+
+def _get_rotation_channel(rotation_mode: str) -> str:
+    if rotation_mode == "QUATERNION":
+        return "rotation_quaternion"
+    if rotation_mode == "AXIS_ANGLE":
+        return "rotation_axis_angle"
+    return "rotation_euler"
+
+
+def _convert_rotation_channels(channels: "dict[str, np.ndarray]", source_modes: np.ndarray, target_modes: np.ndarray):
+    """Rewrite the rotation channels (F, B, C) of bones whose rotation modes change."""
+    changed = source_modes != target_modes
+    if not changed.any():
+        return channels
+    changed_channels = {attr: value[:, changed] for attr, value in channels.items()}
+    rotation = _get_rotation_matrices(changed_channels, source_modes[changed])
+    idx = np.flatnonzero(changed)
+    quats = _make_quats_continuous(_mat3_to_quat(rotation.reshape(-1, 3, 3)).reshape(rotation.shape[:2] + (4,)))
+    for j, (i, mode) in enumerate(zip(idx, target_modes[changed])):
+        if mode == "QUATERNION":
+            channels["rotation_quaternion"][:, i] = quats[:, j]
+        elif mode == "AXIS_ANGLE":
+            half_angle = np.arccos(np.clip(quats[:, j, 0], -1, 1))
+            axis = quats[:, j, 1:] / np.maximum(np.sin(half_angle)[:, None], 1e-30)
+            axis[np.sin(half_angle) < 1e-6] = (0, 1, 0)
+            channels["rotation_axis_angle"][:, i, 0] = half_angle * 2
+            channels["rotation_axis_angle"][:, i, 1:] = axis
+        else:
+            channels["rotation_euler"][:, i] = [mathutils.Matrix(m).to_euler(mode) for m in rotation[:, j]]
+    return channels
+
+
+def _get_object_fcurves(obj: Object):
+    """F-curves of the active action of an object, creating the action (and slot) if needed."""
+    if not obj.animation_data:
+        obj.animation_data_create()
+    anim = obj.animation_data
+    if anim.action is None:
+        action = bpy.data.actions.new(f"{obj.name}Action")
+        if hasattr(action, "slots"):
+            action.slots.new(id_type="OBJECT", name=obj.name)
+        set_action(obj, action)
+    slot = getattr(anim, "action_slot", None)
+    if hasattr(anim.action, "slots") and slot is None:
+        slot = anim.action.slots.new(id_type="OBJECT", name=obj.name)
+        anim.action_slot = slot
+    return get_action_fcurves(anim.action, slot, ensure=True)
+
+
+def copy_pose(source_obj: Object, target_obj: Object, frame_range: "tuple[int, int]" = None):
+    """
+    Copy the local pose channels of bones sharing the same names from `source_obj` to `target_obj`, like
+    `pose.copy` + `pose.paste` but without touching the selection or the clipboard. Bones missing in either armature
+    are skipped, and rotations are converted when the rotation modes differ.
+    With `frame_range`, the active action of the source is sampled on every frame of the range and keyed into the
+    active action of the target (created if needed); otherwise only the current pose is copied.
+    """
+    source_index = get_armature_index(source_obj)
+    target_index = get_armature_index(target_obj)
+    names = [name for name in source_index.names if name in target_index.bones_idx_dict]
+    src_idx = np.array([source_index.bones_idx_dict[name] for name in names], dtype=np.int64)
+    tgt_idx = np.array([target_index.bones_idx_dict[name] for name in names], dtype=np.int64)
+    source_bones = source_obj.pose.bones
+    target_bones = target_obj.pose.bones
+
+    if frame_range is None:
+        frames = None
+        channels = {attr: _foreach_get_vector(source_bones, attr, size)[None] for attr, size in _POSE_CHANNELS.items()}
+    else:
+        frames = np.arange(round(frame_range[0]), round(frame_range[1]) + 1, dtype=np.float64)
+        anim = source_obj.animation_data
+        action = anim.action if anim else None
+        slot = getattr(anim, "action_slot", None) if anim else None
+        channels = get_action_channels(source_obj, action, frames, slot, source_index)
+    channels = {attr: value[:, src_idx] for attr, value in channels.items()}
+    source_modes = np.array([bone.rotation_mode for bone in source_bones])[src_idx]
+    target_modes = np.array([bone.rotation_mode for bone in target_bones])[tgt_idx]
+    channels = _convert_rotation_channels(channels, source_modes, target_modes)
+    rotation_channels = np.array([_get_rotation_channel(mode) for mode in target_modes])
+
+    if frames is None:
+        for attr, size in _POSE_CHANNELS.items():
+            mask = rotation_channels == attr if attr.startswith("rotation") else slice(None)
+            values = _foreach_get_vector(target_bones, attr, size)
+            values[tgt_idx[mask]] = channels[attr][0, mask]
+            target_bones.foreach_set(attr, values.astype(np.float32).ravel())
+    else:
+        fcurves = _get_object_fcurves(target_obj)
+        for j, name in enumerate(names):
+            bone = target_bones[name]
+            for attr in ("location", rotation_channels[j], "scale"):
+                data_path = bone.path_from_id(attr)
+                for k in range(_POSE_CHANNELS[attr]):
+                    fcurve = fcurves.find(data_path, index=k) or _new_fcurve(fcurves, data_path, k, name)
+                    _set_fcurve_keys(fcurve, frames, channels[attr][:, j, k], replace=False)
+    target_obj.update_tag()
+    mark_dirty(target_obj)
+    return target_obj
+
+
+def get_action_array(
+    action: Action,
+    bone_names: "list[str]" = None,
+    channels=("location", "rotation_quaternion", "scale"),
+    frames: np.ndarray = None,
+    slot=None,
+):
+    """
+    Read the pose bone F-curves of `action` into a dense array shaped (F, B, C), with `channels` concatenated along
+    the last axis (10 values per bone by default). `bone_names` defaults to the animated bones and `frames` to all
+    keyed frames; channels without F-curves get their rest values. Returns `(frames, bone_names, array)`.
+    """
+    pose_fcurves = list(_iter_pose_fcurves(action, slot))
+    keys = [_get_fcurve_keys(fcurve) for _, _, fcurve in pose_fcurves]
+    if bone_names is None:
+        bone_names = list(dict.fromkeys(bone_name for bone_name, _, _ in pose_fcurves))
+    if frames is None:
+        frames = np.unique(np.concatenate([np.empty(0)] + [key_frames for key_frames, _ in keys]))
+    frames = np.asarray(frames, dtype=np.float64)
+    bones_idx_dict = {name: i for i, name in enumerate(bone_names)}
+    offsets = dict(zip(channels, np.cumsum([0] + [_POSE_CHANNELS[attr] for attr in channels])))
+    defaults = np.concatenate([_POSE_CHANNEL_DEFAULTS[attr] for attr in channels], dtype=np.float64)
+    array = np.tile(defaults, (len(frames), len(bone_names), 1))
+    for (bone_name, attr, fcurve), fcurve_keys in zip(pose_fcurves, keys):
+        i = bones_idx_dict.get(bone_name)
+        if i is not None and attr in offsets:
+            array[:, i, offsets[attr] + fcurve.array_index] = _sample_fcurve(fcurve, frames, fcurve_keys)
+    return frames, bone_names, array
+
+
+def create_action_from_array(
+    array: np.ndarray,
+    bone_names: "list[str]",
+    channels=("location", "rotation_quaternion", "scale"),
+    frames: np.ndarray = None,
+    name="Action",
+    armature_obj: Object = None,
+) -> Action:
+    """
+    Build a new action from an array shaped (F, B, C) laid out as in `get_action_array()`, filling every F-curve
+    at once. `frames` defaults to 1, ..., F. The action is assigned to `armature_obj` if given.
+    """
+    if frames is None:
+        frames = np.arange(1, len(array) + 1)
+    action = bpy.data.actions.new(name)
+    slot = None
+    if hasattr(action, "slots"):
+        slot = action.slots.new(id_type="OBJECT", name=armature_obj.name if armature_obj else name)
+    fcurves = get_action_fcurves(action, slot, ensure=True)
+    for i, bone_name in enumerate(bone_names):
+        offset = 0
+        for attr in channels:
+            data_path = f'pose.bones["{bpy.utils.escape_identifier(bone_name)}"].{attr}'
+            for k in range(_POSE_CHANNELS[attr]):
+                _set_fcurve_keys(_new_fcurve(fcurves, data_path, k, bone_name), frames, array[:, i, offset + k])
+            offset += _POSE_CHANNELS[attr]
+    if armature_obj is not None:
+        set_action(armature_obj, action)
+    return action
+
+
+def _iter_action_fcurves(action: Action):
+    """All F-curves of an action, across the slots, layers and strips of layered actions."""
+    if not hasattr(action, "layers"):
+        yield from action.fcurves
+        return
+    for layer in action.layers:
+        for strip in layer.strips:
+            for channelbag in strip.channelbags:
+                yield from channelbag.fcurves
+
+
+def _simplify_polylines(
+    x: np.ndarray, y: np.ndarray, starts: np.ndarray, tolerance: np.ndarray
+) -> "tuple[np.ndarray, np.ndarray]":
+    """
+    Ramer-Douglas-Peucker on concatenated polylines (`starts` are their first indices), run on all segments
+    at once. The error is the absolute difference to the linear interpolation of the kept points, which must not
+    exceed the per-point `tolerance`. Returns the mask of kept points and the errors of all points.
+    """
+    keep = np.zeros(len(x), dtype=bool)
+    keep[starts] = True
+    keep[np.r_[starts[1:], len(x)] - 1] = True
+    error = np.zeros(len(x))
+    # points of the segments that are not resolved yet
+    active = np.flatnonzero(~keep)
+    while len(active) > 0:
+        kept = np.flatnonzero(keep)
+        pos = np.searchsorted(kept, active)
+        left, right = kept[pos - 1], kept[pos]
+        span = x[right] - x[left]
+        t = np.divide(x[active] - x[left], span, out=np.zeros(len(active)), where=span != 0)
+        active_error = np.abs(y[active] - (y[left] + t * (y[right] - y[left])))
+        excess = active_error - tolerance[active]
+        # active points are sorted, so the points of a segment are contiguous
+        group_starts = np.flatnonzero(np.r_[True, left[1:] != left[:-1]])
+        group_sizes = np.diff(np.r_[group_starts, len(active)])
+        group_max = np.maximum.reduceat(excess, group_starts)
+        unresolved = np.repeat(group_max > 0, group_sizes)
+        error[active[~unresolved]] = active_error[~unresolved]
+        if not unresolved.any():
+            break
+        # split each unresolved segment at its point of maximum error
+        is_max = np.flatnonzero(unresolved & (excess == np.repeat(group_max, group_sizes)))
+        split = active[is_max[np.r_[True, left[is_max][1:] != left[is_max][:-1]]]]
+        keep[split] = True
+        active = active[unresolved & ~keep[active]]
+    return keep, error
+
+
+def simplify_actions(
+    actions: "Action | list[Action]", tolerance=1e-3, channel_tolerance: "dict[str, float]" = None
+) -> "dict":
+    """
+    Remove keys that can be linearly interpolated from their neighbours within `tolerance` (per property name in
+    `channel_tolerance`, e.g. `{"rotation_quaternion": 1e-4}`), and set the remaining keys to linear interpolation.
+    F-curves with modifiers or constant interpolation are left untouched.
+    Returns the key counts, the compression ratio and the max error of every simplified channel.
+    """
+    if isinstance(actions, Action):
+        actions = [actions]
+    if channel_tolerance is None:
+        channel_tolerance = {}
+    fcurves, channels, keys, tolerances = [], [], [], []
+    for action in actions:
+        for fcurve in _iter_action_fcurves(action):
+            keyframe_points = fcurve.keyframe_points
+            if len(keyframe_points) < 3 or len(fcurve.modifiers) > 0:
+                continue
+            interpolation = np.empty(len(keyframe_points), dtype=np.int32)
+            keyframe_points.foreach_get("interpolation", interpolation)
+            if np.any(interpolation == 0):  # CONSTANT
+                continue
+            fcurves.append(fcurve)
+            channels.append((action.name, fcurve.data_path, fcurve.array_index))
+            keys.append(_get_fcurve_keys(fcurve))
+            attr = fcurve.data_path.rsplit(".", 1)[-1]
+            tolerances.append(channel_tolerance.get(attr, tolerance))
+    num_keys_before = sum(len(key_frames) for key_frames, _ in keys)
+    stats = {"num_keys_before": num_keys_before, "num_keys_after": num_keys_before, "compression_ratio": 1.0}
+    stats["max_error"] = {}
+    if not fcurves:
+        return stats
+
+    lengths = np.array([len(key_frames) for key_frames, _ in keys])
+    starts = np.r_[0, np.cumsum(lengths)[:-1]]
+    x = np.concatenate([key_frames for key_frames, _ in keys]).astype(np.float64)
+    y = np.concatenate([key_values for _, key_values in keys]).astype(np.float64)
+    keep, error = _simplify_polylines(x, y, starts, np.repeat(tolerances, lengths))
+    max_error = np.maximum.reduceat(error, starts)
+    for fcurve, start, length in zip(fcurves, starts, lengths):
+        kept = keep[start : start + length]
+        _set_fcurve_keys(fcurve, x[start : start + length][kept], y[start : start + length][kept], linear=True)
+
+    stats["num_keys_after"] = int(keep.sum())
+    stats["compression_ratio"] = num_keys_before / max(stats["num_keys_after"], 1)
+    stats["max_error"] = dict(zip(channels, max_error.tolist()))
+    return stats
+
+
+def _get_action_bones(action: Action) -> "list[str]":
+    parsed = (_parse_pose_bone_path(fcurve.data_path) for fcurve in _iter_action_fcurves(action))
+    return sorted({bone_name for bone_name, _ in filter(None, parsed)})
+
+
+class MotionLibrary:
+    """
+    Index of the actions stored in .blend files, loading single actions on demand.
+    The index (frame range and animated bones of every action) is persisted as JSON at `index_path`, and loaded
+    actions are kept in an LRU cache of `max_loaded` actions; older ones are removed unless they are still in use.
+    """
+
+    def __init__(self, index_path: str, max_loaded=32):
+        self.index_path = os.path.abspath(bpy.path.abspath(index_path))
+        self.max_loaded = max_loaded
+        # {filepath: {"mtime": float, "actions": {action_name: {"frame_range": [start, end], "bones": [...]}}}}
+        self.files: "dict[str, dict]" = {}
+        if os.path.isfile(self.index_path):
+            with open(self.index_path, encoding="utf-8") as f:
+                self.files = json.load(f)["files"]
+        self._action_files = self._get_action_files()
+        # actions are identified by `(filepath, action_name)`, as different files may hold actions of the same name
+        self._loaded: "OrderedDict[tuple[str, str], Action]" = OrderedDict()
+
+    def __len__(self):
+        return sum(len(filepaths) for filepaths in self._action_files.values())
+
+    def __contains__(self, key: "str | tuple[str, str]"):
+        if isinstance(key, str):
+            return key in self._action_files
+        filepath, name = key
+        return name in self.files.get(filepath, {}).get("actions", {})
+
+    @property
+    def names(self) -> "list[str]":
+        return list(self._action_files)
+
+    @property
+    def keys(self) -> "list[tuple[str, str]]":
+        return [(filepath, name) for filepath, entry in self.files.items() for name in entry["actions"]]
+
+    def _get_action_files(self) -> "dict[str, list[str]]":
+        action_files = {}
+        for filepath, entry in self.files.items():
+            for name in entry["actions"]:
+                action_files.setdefault(name, []).append(filepath)
+        return action_files
+
+    def _get_key(self, name: "str | tuple[str, str]", filepath: str = None) -> "tuple[str, str]":
+        if not isinstance(name, str):
+            filepath, name = name
+        if filepath is None:
+            filepaths = self._action_files.get(name, [])
+            assert filepaths, f"Action `{name}` is not indexed"
+            assert len(filepaths) == 1, f"Action `{name}` is in several files, please specify one of {filepaths}"
+            filepath = filepaths[0]
+        else:
+            filepath = os.path.abspath(bpy.path.abspath(filepath))
+            assert (filepath, name) in self, f"Action `{name}` is not indexed in `{filepath}`"
+        return filepath, name
+
+    def get_info(self, name: "str | tuple[str, str]", filepath: str = None) -> dict:
+        filepath, name = self._get_key(name, filepath)
+        return {"file": filepath, **self.files[filepath]["actions"][name]}
+
+    def find(self, bones: "list[str]" = None, min_frames=0) -> "list[tuple[str, str]]":
+        """
+        Keys `(filepath, action_name)` of the indexed actions animating all `bones` and lasting at least
+        `min_frames` frames. Keys can be passed to `load()` and `get_info()` as is.
+        """
+        bones = set(bones or [])
+        return [
+            (filepath, name)
+            for filepath, entry in self.files.items()
+            for name, info in entry["actions"].items()
+            if bones.issubset(info["bones"]) and info["frame_range"][1] - info["frame_range"][0] + 1 >= min_frames
+        ]
+
+    def scan(self, paths: "str | list[str]", recursive=True, save=True) -> int:
+        """
+        Index the actions of .blend files, or of all .blend files under directories. Files not modified since
+        the last scan are skipped and missing files are dropped. Returns the number of scanned files.
+        """
+        filepaths = []
+        for path in [paths] if isinstance(paths, str) else paths:
+            path = os.path.abspath(bpy.path.abspath(path))
+            if os.path.isdir(path):
+                pattern = os.path.join(path, "**", "*.blend") if recursive else os.path.join(path, "*.blend")
+                filepaths.extend(sorted(glob.glob(pattern, recursive=recursive)))
+            else:
+                filepaths.append(path)
+        num_scanned = 0
+        for filepath in filepaths:
+            mtime = os.path.getmtime(filepath)
+            entry = self.files.get(filepath)
+            if entry is not None and entry["mtime"] == mtime:
+                continue
+            self.files[filepath] = {"mtime": mtime, "actions": self._scan_file(filepath)}
+            num_scanned += 1
+        for filepath in [filepath for filepath in self.files if not os.path.isfile(filepath)]:
+            del self.files[filepath]
+        self._action_files = self._get_action_files()
+        if save:
+            self.save()
+        return num_scanned
+
+    @staticmethod
+    def _scan_file(filepath: str) -> "dict[str, dict]":
+        libraries = set(bpy.data.libraries)
+        # linked actions are only read, not made local
+        with bpy.data.libraries.load(filepath, link=True) as (data_from, data_to):
+            data_to.actions = list(data_from.actions)
+        actions = {}
+        library = None
+        for action in data_to.actions:
+            if action is None:
+                continue
+            actions[action.name] = {"frame_range": list(action.frame_range), "bones": _get_action_bones(action)}
+            library = action.library
+        if library is not None and library not in libraries:
+            bpy.data.libraries.remove(library)
+        return actions
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+        tmp_path = f"{self.index_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"files": self.files}, f)
+        os.replace(tmp_path, self.index_path)
+
+    def load(self, name: "str | tuple[str, str]", filepath: str = None) -> Action:
+        """
+        Append the action `name` from its .blend file, or get it from the cache if already loaded.
+        `filepath` is required if several indexed files have an action named `name`; a key from `find()` has both.
+        """
+        key = self._get_key(name, filepath)
+        action = self._loaded.get(key)
+        if action is not None:
+            try:
+                action.name
+            except ReferenceError:  # removed outside of the library
+                action = None
+        if action is None:
+            filepath, name = key
+            with bpy.data.libraries.load(filepath, link=False) as (data_from, data_to):
+                data_to.actions = [name]
+            action = data_to.actions[0]
+            assert action is not None, f"Action `{name}` is not found in `{filepath}`, please rescan"
+            self._loaded[key] = action
+        self._loaded.move_to_end(key)
+        self._evict(self.max_loaded, protected=key)
+        return action
+
+    def _evict(self, max_loaded: int, protected: "tuple[str, str]" = None):
+        for key in list(self._loaded):
+            if len(self._loaded) <= max_loaded:
+                break
+            if key == protected:
+                continue
+            action = self._loaded[key]
+            try:
+                if action.users > int(action.use_fake_user):
+                    continue
+                bpy.data.actions.remove(action)
+            except ReferenceError:
+                pass
+            del self._loaded[key]
+
+    def clear(self):
+        """Remove all cached actions that are not in use."""
+        self._evict(0)
+
+
+_BONE_PATH = re.compile(r'(?<=bones\[")((?:[^"\\]|\\.)*)(?="\])')
+
+
+def _iter_action_groups(action: Action):
+    if not hasattr(action, "layers"):
+        yield from action.groups
+        return
+    for layer in action.layers:
+        for strip in layer.strips:
+            for channelbag in strip.channelbags:
+                yield from channelbag.groups
+
+
+def _get_rename_order(names: "set[str]", rename_map: "dict[str, str]") -> "list[tuple[str, str]]":
+    """
+    Order renames so that no name is taken while still in use. Cycles (e.g. swaps) are broken with temporary names.
+    """
+    pending = {old: new for old, new in rename_map.items() if old != new and old in names}
+    in_use = set(names)
+    # targets that are taken by names that are kept
+    conflicts = [new for new in pending.values() if new in in_use and new not in pending]
+    assert not conflicts, f"Names already in use: {conflicts}"
+    assert len(set(pending.values())) == len(pending), "Rename map contains duplicated targets"
+    order = []
+    while pending:
+        ready = [old for old, new in pending.items() if new not in in_use]
+        if not ready:
+            # only cycles remain, move one name out of the way
+            old = next(iter(pending))
+            temp = f"{old}.bu-rename-temp"
+            while temp in in_use:
+                temp += "_"
+            order.append((old, temp))
+            in_use.discard(old)
+            in_use.add(temp)
+            pending[temp] = pending.pop(old)
+            continue
+        for old in ready:
+            order.append((old, pending.pop(old)))
+            in_use.discard(old)
+            in_use.add(order[-1][1])
+    return order
+
+
+def _rename_items(items: list, names: "list[str]", rename_map: "dict[str, str]"):
+    """Rename items given their names before any renaming, through temporary names to avoid collisions."""
+    changed = [(item, rename_map[name]) for item, name in zip(items, names) if name in rename_map]
+    changed = [(item, new) for item, new in changed if item.name != new]
+    for i, (item, _) in enumerate(changed):
+        item.name = f"bu-rename-temp.{i}"
+    for item, new in changed:
+        item.name = new
+
+
+def rename_bones(
+    armature_obj: Object,
+    rename_map: "dict[str, str]",
+    actions: "list[Action]" = None,
+    mesh_obj_list: "list[Object]" = None,
+) -> "dict[str, str]":
+    """
+    Rename bones of an armature, together with the vertex groups of `mesh_obj_list` (default: meshes deformed by
+    the armature) and the `bones["..."]` data paths and groups of the F-curves in `actions` (default: the actions
+    used by the armature objects, including NLA strips). Returns the renames actually applied.
+    """
+    armature_data: Armature = armature_obj.data
+    if armature_data.is_editmode:
+        # bones are synced from edit bones when leaving edit mode
+        with Mode("OBJECT", armature_obj):
+            return rename_bones(armature_obj, rename_map, actions, mesh_obj_list)
+    bone_names = {bone.name for bone in armature_data.bones}
+    rename_map = {old: new for old, new in rename_map.items() if old != new and old in bone_names}
+    order = _get_rename_order(bone_names, rename_map)
+    if not order:
+        return rename_map
+    users = [obj for obj in bpy.data.objects if obj.data == armature_data]
+    if mesh_obj_list is None:
+        mesh_obj_list = [
+            obj
+            for obj in bpy.data.objects
+            if obj.type == "MESH"
+            and (
+                obj.parent in users
+                or any(mod.type == "ARMATURE" and mod.object in users for mod in obj.modifiers)
+            )
+        ]
+    if actions is None:
+        actions = []
+        for obj in users:
+            anim = obj.animation_data
+            if anim is None:
+                continue
+            actions.append(anim.action)
+            actions.extend(strip.action for track in anim.nla_tracks for strip in track.strips)
+        actions = list(dict.fromkeys(action for action in actions if action is not None))
+
+    # snapshot the names before Blender updates some of them on each bone rename
+    vgroup_names = [[vgroup.name for vgroup in obj.vertex_groups] for obj in mesh_obj_list]
+    fcurves = [fcurve for action in actions for fcurve in _iter_action_fcurves(action)]
+    data_paths = [fcurve.data_path for fcurve in fcurves]
+    groups = [group for action in actions for group in _iter_action_groups(action)]
+    group_names = [group.name for group in groups]
+
+    # detach the actions, so that Blender does not scan their F-curves on every rename
+    detached = []
+    for obj in users:
+        anim = obj.animation_data
+        if anim is None:
+            continue
+        for owner in [anim] + [strip for track in anim.nla_tracks for strip in track.strips]:
+            if owner.action is not None:
+                detached.append((owner, owner.action, getattr(owner, "action_slot", None)))
+                owner.action = None
+    for old, new in order:
+        armature_data.bones[old].name = new
+    for owner, action, slot in detached:
+        owner.action = action
+        if slot is not None:
+            owner.action_slot = slot
+
+    for obj, names in zip(mesh_obj_list, vgroup_names):
+        _rename_items(list(obj.vertex_groups), names, rename_map)
+    escaped_map = {
+        bpy.utils.escape_identifier(old): bpy.utils.escape_identifier(new) for old, new in rename_map.items()
+    }
+    for fcurve, data_path in zip(fcurves, data_paths):
+        new_path = _BONE_PATH.sub(lambda match: escaped_map.get(match.group(1), match.group(1)), data_path)
+        if new_path != fcurve.data_path:
+            fcurve.data_path = new_path
+    _rename_items(groups, group_names, rename_map)
+    invalidate_armature_index(armature_obj)
+    mark_dirty(users + mesh_obj_list)
+    return rename_map
+
+
+def mesh_quads2tris(obj_list: "list[Object]" = None) -> "dict[Mesh, np.ndarray]":
+    """Triangulate the meshes of `obj_list` (default: all meshes). See `triangulate_meshes()`."""
+    mesh_obj_list = get_all_mesh_obj(obj_list)
+    poly_maps = triangulate_meshes(mesh_obj_list)
+    mark_dirty(mesh_obj_list)
+    return poly_maps
 
 
 def get_enabled_addons() -> "list[str]":
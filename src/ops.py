@@ -1,19 +1,36 @@
+import time
+
 import bpy
 
 from .bu import (
     Mode,
-    get_all_armature_obj,
-    get_all_mesh_obj,
+    collect_garbage,
+    copy_pose,
+    get_object_index,
+    iter_apply_pose_as_rest,
+    iter_transfer_all_shape_keys,
+    mark_dirty,
     remove_all,
-    remove_collection,
-    remove_empty,
     remove_unused_actions,
+    rename_bones,
+    retarget_action,
+    run_job,
     select_objs,
-    set_rest_bones,
-    transfer_all_shape_keys,
     update,
 )
 
+# events still handled by the editors while a job runs, so that the view can be navigated
+_JOB_PASS_THROUGH_EVENTS = {
+    "MOUSEMOVE",
+    "INBETWEEN_MOUSEMOVE",
+    "MIDDLEMOUSE",
+    "WHEELUPMOUSE",
+    "WHEELDOWNMOUSE",
+    "TRACKPADPAN",
+    "TRACKPADZOOM",
+    "NDOF_MOTION",
+}
+
 
 def get_source_target_from_selected(context: bpy.types.Context, obj_type: str):
     """Get a source and a target object from the current selection.
@@ -22,12 +39,110 @@ def get_source_target_from_selected(context: bpy.types.Context, obj_type: str):
     """
     target: bpy.types.Object = context.object
     assert target is not None and target.type == obj_type, f"The active object must be a {obj_type}"
-    selected_others = [obj for obj in context.selected_objects if obj.type == obj_type and obj != target]
+    selected = get_object_index(context).get(obj_type, sort=False, selected=True)
+    selected_others = [obj for obj in selected if obj != target]
     assert len(selected_others) == 1, f"Please also select the source {obj_type}"
     source = selected_others[0]
     return source, target
 
 
+def _count_selected(context: bpy.types.Context, obj_type: str) -> int:
+    """
+    Number of selected objects of a type, for polls. The object index is not validated to keep redraws cheap:
+    selection changed by a script with `select_set()` is only seen after the next depsgraph update, so scripts
+    should call `context.view_layer.update()` before relying on these polls.
+    """
+    return get_object_index(context, validate=False).count(obj_type, selected=True)
+
+
+class BUJob:
+    """
+    Mixin for operators whose work is a `bu` job: `job()` returns a generator yielding its progress and returning the
+    message to report. `execute()` (scripts, redo) runs it at once, while `invoke()` runs it from a modal timer in
+    slices of `time_budget` seconds, showing the progress in the Utils panel and the status bar until it finishes
+    or Esc cancels it. Other input is blocked meanwhile, so the job always makes a single undo step.
+    The job reads `self.context`, the context of its current step: the one of `invoke()` is not valid in `modal()`.
+    """
+
+    time_budget = 0.05
+    # the running job, read by the UI
+    label: "str | None" = None
+    progress = 0.0
+
+    def job(self):
+        raise NotImplementedError
+
+    def execute(self, context):
+        self.context = context
+        try:
+            self.report({"INFO"}, run_job(self.job()))
+        finally:
+            self.context = None
+        return {"FINISHED"}
+
+    def invoke(self, context, event):
+        if BUJob.label is not None:
+            self.report({"WARNING"}, f"Wait for `{BUJob.label}` to finish")
+            return {"CANCELLED"}
+        # the generator starts on the first timer event, with the context of `modal()`
+        self._job = self.job()
+        wm = context.window_manager
+        self._timer = wm.event_timer_add(0.01, window=context.window)
+        wm.modal_handler_add(self)
+        wm.progress_begin(0, 1)
+        BUJob.label, BUJob.progress = self.bl_label, 0.0
+        self._update_status(context)
+        return {"RUNNING_MODAL"}
+
+    def modal(self, context, event):
+        self.context = context
+        # any exit but `RUNNING_MODAL` (including errors) removes the timer and clears the running job
+        finished = True
+        try:
+            if event.type == "ESC":
+                self._job.close()
+                # the steps done so far are kept as the undo step of the operator
+                self.report({"WARNING"}, f"Cancelled `{self.bl_label}` at {BUJob.progress:.0%}, undo to revert")
+                return {"FINISHED"}
+            if event.type != "TIMER":
+                finished = False
+                return {"PASS_THROUGH"} if event.type in _JOB_PASS_THROUGH_EVENTS else {"RUNNING_MODAL"}
+
+            deadline = time.perf_counter() + self.time_budget
+            try:
+                # at least one step per event, however long it takes
+                BUJob.progress = next(self._job)
+                while time.perf_counter() < deadline:
+                    BUJob.progress = next(self._job)
+            except StopIteration as stop:
+                self.report({"INFO"}, stop.value)
+                return {"FINISHED"}
+            context.window_manager.progress_update(BUJob.progress)
+            self._update_status(context)
+            finished = False
+            return {"RUNNING_MODAL"}
+        finally:
+            if finished:
+                self._finish(context)
+
+    def _update_status(self, context):
+        if BUJob.label is None:
+            context.workspace.status_text_set(None)
+        else:
+            context.workspace.status_text_set(f"{BUJob.label}: {BUJob.progress:.0%} (Esc to cancel)")
+        for area in context.screen.areas:
+            if area.type == "VIEW_3D":
+                area.tag_redraw()
+
+    def _finish(self, context):
+        wm = context.window_manager
+        wm.event_timer_remove(self._timer)
+        wm.progress_end()
+        BUJob.label = None
+        self._update_status(context)
+        self.context = None
+
+
 class BUShowImport(bpy.types.Operator):
     """Show code for importing the helper module `bu` in console/script"""
 
@@ -52,12 +167,20 @@ class BUUpdateView(bpy.types.Operator):
     bl_label = "Update View"
     bl_options = {"REGISTER"}
 
+    incremental: bpy.props.BoolProperty(
+        name="Incremental",
+        description="Only update objects modified since the last update instead of the whole scene",
+        default=False,
+        # not remembered, so the button always does a full update
+        options={"SKIP_SAVE"},
+    )
+
     @classmethod
     def poll(cls, context):
         return True
 
     def execute(self, context):
-        update(context)
+        update(context, incremental=self.incremental)
         self.report({"INFO"}, "Updated successfully")
         return {"FINISHED"}
 
@@ -91,9 +214,8 @@ class BURemoveEmpty(bpy.types.Operator):
         return True
 
     def execute(self, context):
-        remove_empty()
-        remove_collection("glTF_not_exported")
-        self.report({"INFO"}, "Removed empty objects")
+        stats = collect_garbage((), empties=True, empty_collections=True, collections=["glTF_not_exported"])
+        self.report({"INFO"}, f"Removed {len(stats.get('OBJECT', []))} empty objects")
         return {"FINISHED"}
 
 
@@ -256,7 +378,8 @@ class BUClearAllVertexGroups(bpy.types.Operator):
 
     def execute(self, context):
         context.object.vertex_groups.clear()
-        update(context)
+        mark_dirty(context.object)
+        update(context, incremental=True)
         self.report({"INFO"}, f"Cleared all vertex groups from `{context.object.name}`")
         return {"FINISHED"}
 
@@ -274,7 +397,7 @@ class BUTransferVertexGroups(bpy.types.Operator):
             context.object is not None
             and context.object.type == "MESH"
             and context.area.ui_type == "VIEW_3D"
-            and len(get_all_mesh_obj(context.selected_objects)) == 2
+            and _count_selected(context, "MESH") == 2
         )
 
     def execute(self, context):
@@ -295,7 +418,8 @@ class BUTransferVertexGroups(bpy.types.Operator):
             mix_mode="REPLACE",
         )
 
-        update(context)
+        mark_dirty(target_mesh)
+        update(context, incremental=True)
         context.view_layer.objects.active = target_mesh
         select_objs([target_mesh], deselect_first=True)
         self.report({"INFO"}, f"Transferred all vertex groups from `{source_mesh.name}` to `{target_mesh.name}`")
@@ -320,7 +444,7 @@ class BUClearAllShapeKeys(bpy.types.Operator):
         return {"FINISHED"}
 
 
-class BUTransferShapeKeys(bpy.types.Operator):
+class BUTransferShapeKeys(BUJob, bpy.types.Operator):
     """Transfer shape keys from one Mesh to another"""
 
     bl_idname = "bu.transfer_shapekeys"
@@ -333,19 +457,18 @@ class BUTransferShapeKeys(bpy.types.Operator):
             context.object is not None
             and context.object.type == "MESH"
             and context.area.ui_type == "VIEW_3D"
-            and len(get_all_mesh_obj(context.selected_objects)) == 2
+            and _count_selected(context, "MESH") == 2
         )
 
-    def execute(self, context):
-        source_mesh, target_mesh = get_source_target_from_selected(context, "MESH")
+    def job(self):
+        source_mesh, target_mesh = get_source_target_from_selected(self.context, "MESH")
 
-        transfer_all_shape_keys(source_mesh, target_mesh, clear_existing=True)
+        yield from iter_transfer_all_shape_keys(source_mesh, target_mesh, clear_existing=True)
 
-        update(context)
-        context.view_layer.objects.active = target_mesh
+        update(self.context, incremental=True)
+        self.context.view_layer.objects.active = target_mesh
         select_objs([target_mesh], deselect_first=True)
-        self.report({"INFO"}, f"Transferred shape keys from `{source_mesh.name}` to `{target_mesh.name}`")
-        return {"FINISHED"}
+        return f"Transferred shape keys from `{source_mesh.name}` to `{target_mesh.name}`"
 
 
 class BUToggleRest(bpy.types.Operator):
@@ -406,37 +529,18 @@ class BUCopyPose(bpy.types.Operator):
             context.object is not None
             and context.object.type == "ARMATURE"
             and context.area.ui_type == "VIEW_3D"
-            and len(get_all_armature_obj(context.selected_objects)) == 2
+            and _count_selected(context, "ARMATURE") == 2
         )
 
     def execute(self, context):
         source_armature, target_armature = get_source_target_from_selected(context, "ARMATURE")
-
-        with Mode("POSE", source_armature):
-            try:
-                for b in source_armature.data.bones:
-                    b.select = True
-            except AttributeError:  # blender>=5.0
-                for b in source_armature.pose.bones:
-                    b.select = True
-            bpy.ops.pose.copy()
-        with Mode("POSE", target_armature):
-            try:
-                for b in target_armature.data.bones:
-                    b.select = True
-            except AttributeError:  # blender>=5.0
-                for b in target_armature.pose.bones:
-                    b.select = True
-            bpy.ops.pose.paste(flipped=False)
-
-        update(context)
-        context.view_layer.objects.active = target_armature
-        select_objs([target_armature], deselect_first=True)
+        copy_pose(source_armature, target_armature)
+        update(context, incremental=True)
         self.report({"INFO"}, f"Copied pose from `{source_armature.name}` to `{target_armature.name}`")
         return {"FINISHED"}
 
 
-class BUResetRest(bpy.types.Operator):
+class BUResetRest(BUJob, bpy.types.Operator):
     """Apply current pose as rest pose (select the target Armature first)"""
 
     bl_idname = "bu.reset_rest"
@@ -447,10 +551,10 @@ class BUResetRest(bpy.types.Operator):
     def poll(cls, context):
         return context.object is not None and context.object.type == "ARMATURE"
 
-    def execute(self, context):
-        set_rest_bones(context.object, reset_as_rest=True)
-        self.report({"INFO"}, f"Set current pose as rest for `{context.object.name}`")
-        return {"FINISHED"}
+    def job(self):
+        armature_obj = self.context.object
+        yield from iter_apply_pose_as_rest(armature_obj)
+        return f"Set current pose as rest for `{armature_obj.name}`"
 
 
 class BULoadBonesToText(bpy.types.Operator):
@@ -514,23 +618,11 @@ class BURenameBonesFromText(bpy.types.Operator):
             self.report({"INFO"}, "No bone names need to be changed")
             return {"FINISHED"}
 
-        # Use a two-pass rename to avoid swap conflicts (A->B, B->A)
-        temp_suffix = ".bu-rename-temp"
-        with Mode("EDIT", armature_obj):
-            edit_bones = armature_obj.data.edit_bones
-            bones_to_rename = []
-            for old_name in rename_map:
-                if old_name in edit_bones:
-                    eb = edit_bones[old_name]
-                    temp_name = old_name + temp_suffix
-                    eb.name = temp_name
-                    bones_to_rename.append((eb, rename_map[old_name]))
-                else:
-                    self.report({"WARNING"}, f"Bone '{old_name}' not found in edit mode")
-            for eb, final_name in bones_to_rename:
-                eb.name = final_name
-
-        self.report({"INFO"}, f"Successfully renamed {len(rename_map)} bones")
+        renamed = rename_bones(armature_obj, rename_map)
+        for old_name in rename_map:
+            if old_name not in renamed:
+                self.report({"WARNING"}, f"Bone '{old_name}' not found, skipped")
+        self.report({"INFO"}, f"Successfully renamed {len(renamed)} bones")
         return {"FINISHED"}
 
 
@@ -560,6 +652,49 @@ class BURetarget(bpy.types.Operator):
         return bpy.ops.arp.retarget("INVOKE_DEFAULT")
 
 
+class BURetargetNative(bpy.types.Operator):
+    """Retarget the source animation to the target armature without add-ons, matching bones by name or the Bone Map"""
+
+    bl_idname = "bu.retarget_native"
+    bl_label = "Retarget (Native)"
+    bl_options = {"REGISTER", "UNDO"}
+
+    @classmethod
+    def poll(cls, context):
+        wm = context.window_manager
+        return (
+            None not in (wm.bu_retarget_src, wm.bu_retarget_tgt)
+            and wm.bu_retarget_src.animation_data is not None
+            and wm.bu_retarget_src.animation_data.action is not None
+        )
+
+    def execute(self, context):
+        wm = context.window_manager
+        source, target = wm.bu_retarget_src, wm.bu_retarget_tgt
+        source_bones, target_bones = source.data.bones, target.data.bones
+        if wm.bu_retarget_map_text_block is None:
+            bone_map = {bone.name: bone.name for bone in source_bones}
+        else:
+            bone_map = {}
+            for line in wm.bu_retarget_map_text_block.lines:
+                if not line.body.strip():
+                    continue
+                if "=" not in line.body:
+                    self.report({"ERROR"}, f"Invalid bone map line `{line.body}`, expected `source = target`")
+                    return {"CANCELLED"}
+                src, tgt = line.body.rsplit("=", 1)
+                bone_map[src.strip()] = tgt.strip()
+        bone_map = {src: tgt for src, tgt in bone_map.items() if src in source_bones and tgt in target_bones}
+        # the root is given by its target name, `retarget_action()` takes the source one
+        root = next((src for src, tgt in bone_map.items() if tgt == wm.bu_retarget_root), None)
+        if root is None:
+            self.report({"ERROR"}, f"Root bone `{wm.bu_retarget_root}` is not mapped between both armatures")
+            return {"CANCELLED"}
+        action = retarget_action(source, source.animation_data.action, target, bone_map, root, wm.bu_retarget_inplace)
+        self.report({"INFO"}, f"Retargeted {len(bone_map)} bones to `{target.name}` as `{action.name}`")
+        return {"FINISHED"}
+
+
 def register():
     bpy.utils.register_class(BUShowImport)
     bpy.utils.register_class(BUUpdateView)
@@ -585,6 +720,7 @@ def register():
     bpy.utils.register_class(BULoadBonesToText)
     bpy.utils.register_class(BURenameBonesFromText)
     bpy.utils.register_class(BURetarget)
+    bpy.utils.register_class(BURetargetNative)
 
 
 def unregister():
@@ -612,3 +748,4 @@ def unregister():
     bpy.utils.unregister_class(BULoadBonesToText)
     bpy.utils.unregister_class(BURenameBonesFromText)
     bpy.utils.unregister_class(BURetarget)
+    bpy.utils.unregister_class(BURetargetNative)
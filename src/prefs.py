@@ -1,6 +1,11 @@
+import hashlib
+import importlib.abc
+import importlib.machinery
+import json
 import os
 import subprocess
 import sys
+import threading
 from enum import Enum
 from importlib.util import find_spec
 
@@ -15,15 +20,62 @@ class CudaResult(Enum):
 class CudaDetect:
     """Checks Cuda version installed in the system"""
 
-    def __init__(self):
+    def __init__(self, detect=True):
         self.result = None
         self.major = 0
         self.minor = 0
         self.micro = 0
         self.has_cuda_hardware = False
 
-        self.has_cuda_device()
-        self.detect_cuda_ver()
+        if detect:
+            self.has_cuda_device()
+            self.detect_cuda_ver()
+
+    @staticmethod
+    def get_cache_key():
+        """Hash of what the detection depends on: the search paths and the installed NVIDIA driver."""
+        driver = ""
+        if os.path.isfile("/proc/driver/nvidia/version"):
+            with open("/proc/driver/nvidia/version", encoding="utf-8") as f:
+                driver = f.read()
+        elif sys.platform.startswith("win"):
+            nvcuda = os.path.join(os.environ.get("SystemRoot", r"C:\Windows"), "System32", "nvcuda.dll")
+            if os.path.isfile(nvcuda):
+                driver = str(os.path.getmtime(nvcuda))
+        state = "\n".join((os.environ.get("PATH", ""), os.environ.get("CPATH", ""), driver))
+        return hashlib.sha1(state.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def get_cache_path():
+        return os.path.join(bpy.utils.user_resource("CONFIG", path=__package__.split(".")[0], create=True), "cuda.json")
+
+    @classmethod
+    def load(cls, key: str):
+        """Cached result of a previous detection with the same key, or None."""
+        try:
+            with open(cls.get_cache_path(), encoding="utf-8") as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if cache.get("key") != key:
+            return None
+        info = cls(detect=False)
+        info.result = CudaResult[cache["result"]]
+        info.major, info.minor, info.micro = cache["version"]
+        info.has_cuda_hardware = cache["has_cuda_hardware"]
+        return info
+
+    def save(self, key: str):
+        cache = {
+            "key": key,
+            "result": self.result.name,
+            "version": [self.major, self.minor, self.micro],
+            "has_cuda_hardware": self.has_cuda_hardware,
+        }
+        cache_path = self.get_cache_path()
+        with open(cache_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(cache, f)
+        os.replace(cache_path + ".tmp", cache_path)
 
     @staticmethod
     def get_cuda_path():
@@ -88,71 +140,184 @@ class CudaDetect:
         self.result = CudaResult.SUCCESS
 
 
+MODULE_PATHS_DEBOUNCE = 0.5  # seconds
+_MODULE_SUFFIXES = tuple(importlib.machinery.all_suffixes())
+
+
+def get_env_module_paths(env_path: str) -> "list[str]":
+    """Directories of a python environment (e.g., conda env) that may contain modules, or [] if it is not one."""
+    if not os.path.isdir(env_path):
+        return []
+
+    if sys.platform.startswith("linux"):
+        lib_path = os.path.join(env_path, "lib")
+        if not os.path.isdir(lib_path):
+            return []
+        py_subdir = [
+            p for p in os.listdir(lib_path) if os.path.isdir(os.path.join(lib_path, p)) and p.startswith("python3.")
+        ]
+        if not py_subdir:
+            return []
+        sitepackages = os.path.join(lib_path, sorted(py_subdir)[-1], "site-packages")
+    else:
+        lib_path = os.path.join(env_path, "Lib")
+        sitepackages = os.path.join(lib_path, "site-packages")
+
+    if not os.path.isdir(sitepackages):
+        return []
+
+    platformpath = os.path.join(sitepackages, sys.platform)
+    platformlibs = os.path.join(platformpath, "lib")
+
+    mod_paths = [lib_path, sitepackages, platformpath, platformlibs]
+    if sys.platform.startswith("win"):
+        mod_paths.append(os.path.join(env_path, "DLLs"))
+        mod_paths.append(os.path.join(sitepackages, "Pythonwin"))
+    # directories added by `.pth` files (e.g., editable installs), as `site` would do
+    for name in sorted(os.listdir(sitepackages)):
+        if name.endswith(".pth"):
+            with open(os.path.join(sitepackages, name), encoding="utf-8", errors="ignore") as f:
+                for line in f:
+                    line = line.strip()
+                    if line and not line.startswith(("#", "import ", "import\t")):
+                        mod_paths.append(os.path.join(sitepackages, line))
+    return [mod_path for mod_path in dict.fromkeys(mod_paths) if os.path.isdir(mod_path)]
+
+
+def _scan_modules(mod_path: str) -> "list[str]":
+    """Names of the top-level modules and packages in a directory."""
+    names = []
+    for entry in os.scandir(mod_path):
+        if entry.is_dir():
+            if entry.name.isidentifier():  # also skips `*.dist-info` and the like
+                names.append(entry.name)
+        elif entry.name.endswith(_MODULE_SUFFIXES):
+            names.append(entry.name.split(".", 1)[0])
+    return names
+
+
+def get_module_index(env_path: str, mod_paths: "list[str]") -> "dict[str, str]":
+    """
+    Index of the top-level modules of an environment: `{name: directory}`, the first directory winning as
+    in `sys.path`. Cached on disk, and only rebuilt when one of the directories is modified.
+    """
+    cache_path = os.path.join(
+        bpy.utils.user_resource("CONFIG", path=__package__.split(".")[0], create=True), "module_index.json"
+    )
+    mtimes = {mod_path: os.stat(mod_path).st_mtime for mod_path in mod_paths}
+    try:
+        with open(cache_path, encoding="utf-8") as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        cache = {}
+    entry = cache.get(env_path)
+    if entry is not None and entry["mtimes"] == mtimes:
+        return entry["modules"]
+
+    index = {}
+    for mod_path in mod_paths:
+        for name in _scan_modules(mod_path):
+            index.setdefault(name, mod_path)
+    cache[env_path] = {"mtimes": mtimes, "modules": index}
+    try:
+        with open(cache_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(cache, f)
+        os.replace(cache_path + ".tmp", cache_path)
+    except OSError as e:
+        print(f"Failed to cache module index: {e}")
+    return index
+
+
+class EnvModuleFinder(importlib.abc.MetaPathFinder):
+    """
+    Resolves the indexed top-level modules from their environment directory, so that `sys.path` does not grow
+    and other imports do not search the environment. Submodules are found through their package's `__path__`.
+    Appended to `sys.meta_path`, so Blender's own modules take precedence as with `sys.path.append()`.
+    Distributions are found in `mod_paths` too, so `importlib.metadata` still sees the environment's packages.
+    """
+
+    def __init__(self, index: "dict[str, str]", mod_paths: "list[str]"):
+        self.index = index
+        self.mod_paths = mod_paths
+
+    def find_spec(self, fullname: str, path=None, target=None):
+        mod_path = self.index.get(fullname) if path is None else None
+        if mod_path is None:
+            return None
+        return importlib.machinery.PathFinder.find_spec(fullname, [mod_path], target)
+
+    def find_distributions(self, context=None):
+        # only called by `importlib.metadata`, so importing it here costs nothing at startup
+        from importlib.metadata import DistributionFinder, MetadataPathFinder
+
+        if context is None:
+            context = DistributionFinder.Context()
+        if "path" in vars(context):
+            # an explicit search path, not the environment
+            return iter(())
+        return MetadataPathFinder.find_distributions(DistributionFinder.Context(name=context.name, path=self.mod_paths))
+
+    def invalidate_caches(self):
+        pass
+
+
+def _apply_module_paths():
+    if not BUPrefs.add_module_paths():
+        print("Modules path not found, please set in addon preferences")
+
+
 class BUPrefs(bpy.types.AddonPreferences):
     bl_idname = __package__.split(".")[0]
 
     _cuda_info: CudaDetect = None
-    _added_paths = []
+    _cuda_cache_key = ""
+    _module_finder: "EnvModuleFinder" = None
     missing_modules = []
 
     @staticmethod
     def check_cuda():
-        BUPrefs._cuda_info = CudaDetect()
+        """
+        Publish the CUDA info from the disk cache, or detect it without blocking the startup: devices are checked
+        from a timer (Cycles preferences are only safe to use on the main thread) and `nvcc` runs in a thread.
+        Skipped in background mode, where nothing would display it.
+        """
+        if bpy.app.background:
+            return
+        key = CudaDetect.get_cache_key()
+        BUPrefs._cuda_info = CudaDetect.load(key)
+        if BUPrefs._cuda_info is None and not bpy.app.timers.is_registered(_detect_cuda_devices):
+            BUPrefs._cuda_cache_key = key
+            bpy.app.timers.register(_detect_cuda_devices, first_interval=1.0, persistent=True)
 
     @staticmethod
     def add_module_paths():
         BUPrefs.reset_module_paths()
         env_path = bpy.context.preferences.addons[__package__.split(".")[0]].preferences.modules_path
 
-        if not os.path.isdir(env_path):
+        mod_paths = get_env_module_paths(env_path)
+        if not mod_paths:
+            # not a python environment, but the user might be still typing
             return False
 
-        if sys.platform.startswith("linux"):
-            lib_path = os.path.join(env_path, "lib")
-            py_subdir = [
-                p for p in os.listdir(lib_path) if os.isdir(os.path.join(lib_path, p)) and p.startswith("python3.")
-            ]
-            if py_subdir:
-                py_subdir = sorted(py_subdir)[-1]
-            sitepackages = os.path.join(lib_path, py_subdir, "site-packages")
-        else:
-            lib_path = os.path.join(env_path, "Lib")
-            sitepackages = os.path.join(lib_path, "site-packages")
-
-        if not os.path.isdir(sitepackages):
-            # not a python path, but the user might be still typing
-            return False
-
-        platformpath = os.path.join(sitepackages, sys.platform)
-        platformlibs = os.path.join(platformpath, "lib")
-
-        mod_paths = [lib_path, sitepackages, platformpath, platformlibs]
-        if sys.platform.startswith("win"):
-            mod_paths.append(os.path.join(env_path, "DLLs"))
-            mod_paths.append(os.path.join(sitepackages, "Pythonwin"))
-
-        for mod_path in mod_paths:
-            if not os.path.isdir(mod_path):
-                # print(f"{mod_path} not a directory, skipping")
-                continue
-            if mod_path not in sys.path:
-                print(f"Adding to path: {mod_path}")
-                sys.path.append(mod_path)
-                BUPrefs._added_paths.append(mod_path)
-
+        BUPrefs._module_finder = EnvModuleFinder(get_module_index(env_path, mod_paths), mod_paths)
+        sys.meta_path.append(BUPrefs._module_finder)
+        print(f"Added {len(BUPrefs._module_finder.index)} modules from: {env_path}")
         BUPrefs.check_modules()
         return True
 
     @staticmethod
     def reset_module_paths():
-        # FIXME: even if we do this, additional modules are still available
-        for mod_path in BUPrefs._added_paths:
-            print(f"Removing module path: {mod_path}")
-            sys.path.remove(mod_path)
-        BUPrefs._added_paths.clear()
+        # FIXME: even if we do this, already imported modules are still available
+        if BUPrefs._module_finder in sys.meta_path:
+            print("Removing module finder")
+            sys.meta_path.remove(BUPrefs._module_finder)
+        BUPrefs._module_finder = None
 
     def update_modules(self, context):
-        self.add_module_paths()
+        # the field updates on every keystroke, only apply the path once the user stops typing
+        if bpy.app.timers.is_registered(_apply_module_paths):
+            bpy.app.timers.unregister(_apply_module_paths)
+        bpy.app.timers.register(_apply_module_paths, first_interval=MODULE_PATHS_DEBOUNCE)
 
     modules_path: bpy.props.StringProperty(
         name="Environment path",
@@ -170,8 +335,9 @@ class BUPrefs(bpy.types.AddonPreferences):
     def check_modules():
         BUPrefs.missing_modules.clear()
         required_modules = []
+        index = BUPrefs._module_finder.index if BUPrefs._module_finder else {}
         for mod_name in required_modules:
-            if not find_spec(mod_name):
+            if mod_name not in index and mod_name not in sys.modules and not find_spec(mod_name):
                 BUPrefs.missing_modules.append(mod_name)
 
         preferences = bpy.context.preferences.addons[__package__.split(".")[0]].preferences
@@ -215,22 +381,48 @@ class BUPrefs(bpy.types.AddonPreferences):
         sp_col.prop(self, "modules_path", text="Modules Path")
 
 
+def _detect_cuda_devices():
+    info = CudaDetect(detect=False)
+    try:
+        info.has_cuda_device()
+    except Exception as e:
+        print(f"Failed to check CUDA devices: {e}")
+    threading.Thread(target=_detect_cuda_version, args=(info, BUPrefs._cuda_cache_key), daemon=True).start()
+
+
+def _detect_cuda_version(info: CudaDetect, key: str):
+    try:
+        info.detect_cuda_ver()
+    except Exception as e:
+        print(f"Failed to detect CUDA version: {e}")
+        info.result = CudaResult.NOT_FOUND
+    # only published once complete, so that `draw()` never sees a partial result
+    BUPrefs._cuda_info = info
+    try:
+        info.save(key)
+    except OSError as e:
+        print(f"Failed to cache CUDA info: {e}")
+
+
 def register():
     bpy.utils.register_class(BUPrefs)
     BUPrefs.check_cuda()
-    if not BUPrefs.add_module_paths():
-        print("Modules path not found, please set in addon preferences")
+    _apply_module_paths()
     BUPrefs.check_modules()
 
 
 def unregister():
     try:
-        import torch
+        # only if already imported, importing it from the environment here would be slow
+        torch = sys.modules["torch"]
 
         if torch.cuda.is_available():
             torch.cuda.empty_cache()
     except Exception:
         pass
 
+    for timer in (_detect_cuda_devices, _apply_module_paths):
+        if bpy.app.timers.is_registered(timer):
+            bpy.app.timers.unregister(timer)
     BUPrefs.reset_module_paths()
     bpy.utils.unregister_class(BUPrefs)
@@ -1,5 +1,167 @@
+import time
+from typing import Generator
+
 import bpy
 from bpy.props import BoolProperty, PointerProperty, StringProperty
+from bpy.types import Action, Armature, Mesh, Object
+
+from .ops import BUJob
+
+# the statistics are computed by a timer, in slices of `STATS_TIME_BUDGET` seconds every `STATS_INTERVAL` seconds
+STATS_TIME_BUDGET = 0.005
+STATS_INTERVAL = 0.05
+STATS_CHUNK_SIZE = 512
+
+# statistics per `session_uid` of their datablock (or scene), the jobs computing them and the outdated ones
+_stats: "dict[int, dict]" = {}
+_stats_jobs: "dict[int, Generator[None, None, dict]]" = {}
+_stale_stats: "set[int]" = set()
+
+
+def _iter_scene_stats(scene: bpy.types.Scene):
+    objs = list(scene.objects)
+    stats = {"objects": len(objs), "vertices": 0, "bones": 0, "actions": len(bpy.data.actions)}
+    for start in range(0, len(objs), STATS_CHUNK_SIZE):
+        for obj in objs[start : start + STATS_CHUNK_SIZE]:
+            if obj.type == "MESH":
+                stats["vertices"] += len(obj.data.vertices)
+            elif obj.type == "ARMATURE":
+                stats["bones"] += len(obj.data.bones)
+        yield
+    return stats
+
+
+def _iter_mesh_stats(mesh: Mesh):
+    num_vertices = len(mesh.vertices)
+    # nonzero weights per vertex
+    num_weights = max_weights = num_unweighted = 0
+    for start in range(0, num_vertices, STATS_CHUNK_SIZE):
+        vertices = mesh.vertices[start : start + STATS_CHUNK_SIZE]
+        counts = [sum(1 for g in v.groups if g.weight > 0) for v in vertices]
+        num_weights += sum(counts)
+        max_weights = max(max_weights, max(counts))
+        num_unweighted += counts.count(0)
+        yield
+    return {
+        "vertices": num_vertices,
+        "faces": len(mesh.polygons),
+        "shape_keys": len(mesh.shape_keys.key_blocks) - 1 if mesh.shape_keys else 0,
+        "weights_mean": num_weights / max(num_vertices, 1),
+        "weights_max": max_weights,
+        "unweighted": num_unweighted,
+    }
+
+
+def _iter_armature_stats(armature: Armature):
+    bones = armature.bones[:]
+    num_deform = 0
+    for start in range(0, len(bones), STATS_CHUNK_SIZE):
+        num_deform += sum(1 for bone in bones[start : start + STATS_CHUNK_SIZE] if bone.use_deform)
+        yield
+    return {"bones": len(bones), "deform_bones": num_deform}
+
+
+def _iter_action_stats(action: Action):
+    start, end = action.frame_range
+    yield
+    return {"frame_start": start, "frame_end": end}
+
+
+def get_stats(id_data: "bpy.types.ID") -> "dict | None":
+    """
+    Cached statistics of a datablock (or scene), `None` until computed. Missing or outdated statistics are
+    computed in the background, meanwhile the outdated ones are still returned.
+    """
+    key = id_data.session_uid
+    if (key not in _stats or key in _stale_stats) and key not in _stats_jobs:
+        if isinstance(id_data, bpy.types.Scene):
+            _stats_jobs[key] = _iter_scene_stats(id_data)
+        elif isinstance(id_data, Mesh):
+            _stats_jobs[key] = _iter_mesh_stats(id_data)
+        elif isinstance(id_data, Armature):
+            _stats_jobs[key] = _iter_armature_stats(id_data)
+        elif isinstance(id_data, Action):
+            _stats_jobs[key] = _iter_action_stats(id_data)
+        _stale_stats.discard(key)
+        if not bpy.app.timers.is_registered(_update_stats):
+            bpy.app.timers.register(_update_stats, first_interval=STATS_INTERVAL)
+    return _stats.get(key)
+
+
+def _tag_redraw_view3d():
+    for window in bpy.context.window_manager.windows:
+        for area in window.screen.areas:
+            if area.type == "VIEW_3D":
+                area.tag_redraw()
+
+
+def _update_stats():
+    deadline = time.perf_counter() + STATS_TIME_BUDGET
+    finished = False
+    while _stats_jobs and time.perf_counter() < deadline:
+        key, job = next(iter(_stats_jobs.items()))
+        try:
+            next(job)
+        except StopIteration as stop:
+            _stats[key] = stop.value
+            del _stats_jobs[key]
+            finished = True
+        except ReferenceError:  # removed meanwhile
+            del _stats_jobs[key]
+    if finished:
+        _tag_redraw_view3d()
+    return STATS_INTERVAL if _stats_jobs else None
+
+
+@bpy.app.handlers.persistent
+def _on_depsgraph_update(scene, depsgraph):
+    keys = set()
+    for update in depsgraph.updates:
+        id_data = update.id.original
+        if isinstance(id_data, bpy.types.Key):
+            id_data = id_data.user
+        if isinstance(id_data, (Mesh, Armature, Action)):
+            keys.add(id_data.session_uid)
+        if isinstance(id_data, (Mesh, Armature, bpy.types.Scene, bpy.types.Collection)):
+            keys.add(scene.session_uid)
+    # only mark the statistics as outdated, they are computed again when drawn
+    keys.intersection_update(_stats.keys() | _stats_jobs.keys())
+    for key in keys:
+        _stats_jobs.pop(key, None)
+        if key in _stats:
+            _stale_stats.add(key)
+    if keys:
+        _tag_redraw_view3d()
+
+
+@bpy.app.handlers.persistent
+def _on_load(*args):
+    _stats.clear()
+    _stats_jobs.clear()
+    _stale_stats.clear()
+
+
+class JobPanel(bpy.types.Panel):
+    bl_label = "Running Job"
+    bl_idname = "BU_PT_job"
+    bl_space_type = "VIEW_3D"
+    bl_region_type = "UI"
+    bl_context = ""
+    bl_category = "Utils"
+    bl_order = -1
+    bl_ui_units_x = 0
+
+    @classmethod
+    def poll(cls, context):
+        return BUJob.label is not None
+
+    def draw(self, context):
+        layout = self.layout
+
+        row = layout.row()
+        row.progress(factor=BUJob.progress, type="BAR", text=f"{BUJob.label}: {BUJob.progress:.0%}")
+        row = layout.row()
+        row.label(text="Press Esc to cancel", icon="CANCEL")
 
 
 class BasicPanel(bpy.types.Panel):
@@ -127,13 +289,83 @@ class PosePanel(bpy.types.Panel):
         row.prop(wm, "bu_retarget_inplace", text="In-Place Retarget")
         row = layout.row()
         row.operator("bu.retarget", icon="PLAY")
+        row = layout.row()
+        row.prop(wm, "bu_retarget_map_text_block", text="Bone Map", icon="TEXT")
+        row = layout.row()
+        row.operator("bu.retarget_native", icon="PLAY")
+
+
+class StatsPanel(bpy.types.Panel):
+    bl_label = "Statistics"
+    bl_idname = "BU_PT_stats"
+    bl_space_type = "VIEW_3D"
+    bl_region_type = "UI"
+    bl_context = ""
+    bl_category = "Utils"
+    bl_order = 4
+    bl_options = {"DEFAULT_CLOSED"}
+    bl_ui_units_x = 0
+
+    def draw_stats(self, title: str, icon: str, items: "list[tuple[str, str]]"):
+        col = self.layout.column(align=True)
+        col.label(text=title, icon=icon)
+        for name, value in items:
+            row = col.row()
+            row.label(text=name)
+            row.label(text=value)
+
+    def draw(self, context):
+        pending = "..."
+
+        stats = get_stats(context.scene)
+        items = ("Objects", "objects"), ("Vertices", "vertices"), ("Bones", "bones"), ("Actions", "actions")
+        self.draw_stats(
+            "Scene", "SCENE_DATA", [(name, f"{stats[key]:,}" if stats else pending) for name, key in items]
+        )
+
+        obj: Object = context.object
+        if obj is None:
+            return
+        self.layout.separator(type="LINE")
+        if obj.type == "MESH":
+            stats = get_stats(obj.data)
+            items = [("Vertex Groups", f"{len(obj.vertex_groups):,}")]
+            if stats:
+                items = [
+                    ("Vertices", f"{stats['vertices']:,}"),
+                    ("Faces", f"{stats['faces']:,}"),
+                    ("Shape Keys", f"{stats['shape_keys']:,}"),
+                    *items,
+                    ("Weights/Vertex", f"{stats['weights_mean']:.2f} (max {stats['weights_max']})"),
+                    ("Unweighted", f"{stats['unweighted']:,}"),
+                ]
+            else:
+                items.append(("Vertices", pending))
+            self.draw_stats(obj.name, "OUTLINER_OB_MESH", items)
+        elif obj.type == "ARMATURE":
+            stats = get_stats(obj.data)
+            items = [("Bones", f"{stats['bones']:,} ({stats['deform_bones']:,} deform)" if stats else pending)]
+            self.draw_stats(obj.name, "OUTLINER_OB_ARMATURE", items)
+
+        action = obj.animation_data.action if obj.animation_data else None
+        if action is not None:
+            stats = get_stats(action)
+            frames = pending
+            if stats:
+                length = stats["frame_end"] - stats["frame_start"] + 1
+                frames = f"{stats['frame_start']:g}-{stats['frame_end']:g} ({length:g})"
+            self.draw_stats(action.name, "ACTION", [("Frames", frames)])
 
 
 def register():
+    bpy.utils.register_class(JobPanel)
     bpy.utils.register_class(BasicPanel)
     bpy.utils.register_class(VisPanel)
     bpy.utils.register_class(MeshPanel)
     bpy.utils.register_class(PosePanel)
+    bpy.utils.register_class(StatsPanel)
+    bpy.app.handlers.depsgraph_update_post.append(_on_depsgraph_update)
+    bpy.app.handlers.load_post.append(_on_load)
     bpy.types.WindowManager.bu_rename_text_block = PointerProperty(
         type=bpy.types.Text,
         name="Bone Names Text",
@@ -161,15 +393,28 @@ def register():
         description="Retarget animation in-place",
         default=True,
     )
+    bpy.types.WindowManager.bu_retarget_map_text_block = PointerProperty(
+        type=bpy.types.Text,
+        name="Bone Map Text",
+        description="Lines of `source = target` bone names for native retargeting (bones are matched by name if empty)",
+    )
 
 
 def unregister():
+    bpy.utils.unregister_class(JobPanel)
     bpy.utils.unregister_class(BasicPanel)
     bpy.utils.unregister_class(VisPanel)
     bpy.utils.unregister_class(MeshPanel)
     bpy.utils.unregister_class(PosePanel)
+    bpy.utils.unregister_class(StatsPanel)
+    bpy.app.handlers.depsgraph_update_post.remove(_on_depsgraph_update)
+    bpy.app.handlers.load_post.remove(_on_load)
+    if bpy.app.timers.is_registered(_update_stats):
+        bpy.app.timers.unregister(_update_stats)
+    _on_load()
     del bpy.types.WindowManager.bu_rename_text_block
     del bpy.types.WindowManager.bu_retarget_src
     del bpy.types.WindowManager.bu_retarget_tgt
     del bpy.types.WindowManager.bu_retarget_root
     del bpy.types.WindowManager.bu_retarget_inplace
+    del bpy.types.WindowManager.bu_retarget_map_text_block